@@ -0,0 +1,81 @@
+"""Engine analysis in a background process, for a UI that has to keep handling events while the engine thinks
+
+The worker process runs the ordinary iterative deepening Search and puts the SearchResult of every completed depth
+on an update queue. The UI calls poll() once a frame, which never blocks.
+Every analysed position gets a new generation number in shared memory. The running search stops as soon as the number
+changes (polled by Search every 1024 nodes), and updates of an older generation are dropped, so moving on to a new
+position cancels the old analysis and nothing stale is ever shown.
+
+Usage:
+    with Analysis() as analysis:
+        analysis.analyse(board.toFEN())
+        ...
+        if update := analysis.poll():
+            print(update)
+"""
+import multiprocessing
+import queue
+import GameBoard
+from Search import Search, SearchResult
+
+def _analysisWorker(commands, updates, generation, hashMB : float, maxDepth : int):
+    """Worker process loop: searches each (generation, FEN) command until a newer generation cancels it, None ends it"""
+    search = Search(hashMB)
+    while (command := commands.get()) is not None:
+        current, FEN = command
+        if current != generation.value: #Already superseded before it started
+            continue
+        board = GameBoard.Board(FEN)
+        search.search(board, maxDepth, callback=lambda result: updates.put((current, result)),
+            stopCondition=lambda: generation.value != current)
+
+class Analysis():
+    """A worker process analysing one position at a time. Close it (or use it in a with block) to end the process"""
+    def __init__(self, hashMB : float = 16, maxDepth : int = None):
+        #spawn, so the worker doesn't inherit the UI's display and event state
+        context = multiprocessing.get_context("spawn")
+        self.__commands = context.Queue()
+        self.__updates = context.Queue()
+        self.__generation = context.Value("i", 0, lock=False) #Only the UI process writes it
+        self.__process = context.Process(target=_analysisWorker, args=(self.__commands, self.__updates, self.__generation, hashMB, maxDepth), daemon=True)
+        self.__process.start()
+        self.latest = None #Newest SearchResult of the current position
+
+    def analyse(self, FEN : str):
+        """Starts analysing FEN, cancelling the analysis of the previous position"""
+        self.__generation.value += 1
+        self.latest = None
+        self.__commands.put((self.__generation.value, FEN))
+
+    def stop(self):
+        """Cancels the current analysis, its remaining updates are dropped"""
+        self.__generation.value += 1
+        self.latest = None
+
+    def poll(self) -> SearchResult:
+        """Takes every update that has arrived without waiting. Returns the newest for the current position, or None if
+        there is nothing new"""
+        newest = None
+        while True:
+            try:
+                generation, result = self.__updates.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.__generation.value:
+                newest = result
+        if newest is not None:
+            self.latest = newest
+        return newest
+
+    def close(self):
+        self.stop()
+        self.__commands.put(None)
+        self.__process.join(1)
+        if self.__process.is_alive():
+            self.__process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,189 @@
+"""Batch analysis: searches every position of a FEN / EPD file across a process pool and writes one JSON line per position
+
+Input is read lazily and only a bounded window of positions is in flight, so memory stays flat however long the input is.
+Results are written in input order and flushed line by line. After a crash, --resume counts the complete lines already
+in the output file, skips that many positions of the input and appends the rest.
+
+Each worker keeps one Board (reset with Board.setPosition) and one Search for all of its positions.
+The transposition table is cleared before every position, so a result doesn't depend on what the worker searched before.
+
+Usage:
+    python BatchAnalysis.py [INPUT] [-o OUTPUT] [--depth N | --nodes N] [--workers N] [--hash MB] [--resume]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import GameBoard
+from GameBoard import Move
+from Search import Search, MATE, MATEBOUND
+
+CHUNKSIZE = 16 #Positions sent to a worker at once
+REPORTINTERVAL = 5 #Seconds between throughput reports
+
+def parsePosition(line : str) -> tuple[str, dict]:
+    """Splits a FEN or EPD line into a FEN String and the EPD operations (e.g. {"id": "\\"WAC.001\\"", "bm": "Qg6"})"""
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid position: {line}")
+    rest = line.split(None, 6)
+    if len(rest) >= 6 and rest[4].isdigit() and rest[5].isdigit(): #Full FEN, anything after it is ignored
+        return " ".join(rest[:6]), {}
+
+    operations = {}
+    if len(fields) == 5:
+        for operation in fields[4].split(";"):
+            if operation := operation.strip():
+                opcode, _, operand = operation.partition(" ")
+                operations[opcode] = operand.strip()
+    halfMove = operations.get("hmvc", "0")
+    fullMove = operations.get("fmvn", "1")
+    return " ".join(fields[:4] + [halfMove, fullMove]), operations
+
+def readPositions(stream, skip : int = 0):
+    """Lazily yields (index, line) for every position line of stream, blank lines and # comments are not positions.
+    The first skip positions are read past without being yielded"""
+    index = 0
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if index >= skip:
+            yield index, line
+        index += 1
+
+def scoreFields(score : int) -> dict:
+    if score > MATEBOUND:
+        return {"mate": (MATE - score + 1) // 2}
+    if score < -MATEBOUND:
+        return {"mate": -((MATE + score) // 2)}
+    return {"cp": score}
+
+#Per process state of a pool worker, set up once by _initWorker
+_board = None
+_search = None
+_limits = None
+
+def _initWorker(hashMB : float, maxDepth : int, maxNodes : int):
+    global _board, _search, _limits
+    _board = GameBoard.Board()
+    _search = Search(hashMB)
+    _limits = (maxDepth, maxNodes)
+
+def analysePosition(index : int, line : str) -> dict:
+    """Searches one position with the worker's Board and Search. An unreadable position, or any failure while
+    searching it, gives a result with an error instead of stopping the run"""
+    result = {"index": index}
+    try:
+        FEN, operations = parsePosition(line)
+        _board.setPosition(FEN)
+    except ValueError as error:
+        result["error"] = str(error) or f"Invalid position: {line}"
+        return result
+    result["fen"] = FEN
+    if "id" in operations:
+        result["id"] = operations["id"].strip('"')
+
+    try:
+        _search.table.clear()
+        searchResult = _search.search(_board, *_limits)
+    except Exception as error:
+        result["error"] = f"Search failed: {type(error).__name__}: {error}"
+        return result
+    result["bestmove"] = Move.encodedToAlgebraic(searchResult.bestMove) if searchResult.bestMove else None
+    result.update(scoreFields(searchResult.score))
+    result["depth"] = searchResult.depth
+    result["nodes"] = searchResult.nodes
+    result["pv"] = [Move.encodedToAlgebraic(x) for x in searchResult.pv]
+    return result
+
+def _analyseChunk(chunk : list[tuple[int, str]]) -> list[dict]:
+    return [analysePosition(index, line) for index, line in chunk]
+
+def _chunks(positions, size : int):
+    chunk = []
+    for position in positions:
+        chunk.append(position)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def mapChunks(pool : ProcessPoolExecutor, function, positions, workers : int, chunkSize : int = CHUNKSIZE):
+    """Yields function(chunk) for every chunk of chunkSize items of positions, run on pool, in input order.
+    At most a few chunks per worker are queued, the rest of positions isn't read until results are taken"""
+    pending = deque()
+    for chunk in _chunks(positions, chunkSize):
+        pending.append(pool.submit(function, chunk))
+        if len(pending) >= workers * 4:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def analyseStream(positions, workers : int = None, maxDepth : int = None, maxNodes : int = None, hashMB : float = 4):
+    """Yields the result dict of every (index, line) of positions, in input order"""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(hashMB, maxDepth, maxNodes)) as pool:
+        for results in mapChunks(pool, _analyseChunk, positions, workers):
+            yield from results
+
+def completedLines(path : str) -> int:
+    """Number of complete result lines in an output file, a line cut off by a crash is removed"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as file:
+        data = file.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            file.truncate(end)
+        return data.count(b"\n", 0, end)
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches every position of a FEN / EPD file and writes the results as JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="One FEN or EPD position per line, stdin if omitted or -")
+    parser.add_argument("-o", "--output", help="JSON lines file to write, stdout if omitted")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument("--depth", type=int)
+    limit.add_argument("--nodes", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default one per core)")
+    parser.add_argument("--hash", type=float, default=4, metavar="MB", help="Transposition table size of each worker")
+    parser.add_argument("--resume", action="store_true", help="Skip the positions already in OUTPUT and append the rest")
+    args = parser.parse_args()
+    if args.depth is None and args.nodes is None:
+        args.depth = 4
+    if args.resume and not args.output:
+        parser.error("--resume needs an --output file")
+
+    skip = completedLines(args.output) if args.resume else 0
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = open(args.output, "a" if args.resume else "w") if args.output else sys.stdout
+    if skip:
+        print(f"Resuming after {skip} positions", file=sys.stderr)
+
+    start = lastReport = time.perf_counter()
+    positions = nodes = 0
+    try:
+        for result in analyseStream(readPositions(source, skip), args.workers, args.depth, args.nodes, args.hash):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            positions += 1
+            nodes += result.get("nodes", 0)
+            now = time.perf_counter()
+            if now - lastReport >= REPORTINTERVAL:
+                lastReport = now
+                print(f"{skip + positions} positions, {positions / (now - start):.1f} positions/s, {nodes / (now - start):.0f} nodes/s", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Analysed {positions} positions in {elapsed:.2f}s, {positions / elapsed:.1f} positions/s, {nodes / elapsed:.0f} nodes/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
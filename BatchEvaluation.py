@@ -0,0 +1,264 @@
+"""Vectorized evaluation of many positions at once with NumPy
+
+Positions are packed into an N x 64 int8 array of Board.board piece values (type in the low 3 bits, colour in bits 3-4),
+then every feature is computed for the whole batch with array operations instead of a Python loop per position.
+Squares are laid out like Board.board (rank * 8 + file, a1 = 0). Attack and pawn features work on N uint64
+bitboards per piece set, shifted and filled the way Bitboard builds its tables, so each step touches N words, not N x 64 squares.
+
+Features, per position:
+    midgame, endgame, phase: the material and piece-square sums of Evaluation (the same numbers Board keeps)
+    mobility: squares attacked by knights, bishops, rooks and queens that aren't own pieces, white minus black
+    doubled, isolated, passed: pawn counts, white minus black
+
+Needs NumPy 2.0 or newer (numpy.bitwise_count).
+
+Usage:
+    python BatchEvaluation.py [FENFILE] [--bench N | --check N]
+
+--check N compares every feature of N random positions with scalarFeatures, the same features computed one position
+at a time from Board and Bitboard, so a broken shift mask or fill shows up as a mismatch.
+"""
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import GameBoard
+import Bitboard
+import Evaluation
+from GameBoard import Piece
+
+#Weights of the features that aren't part of Evaluation's tables, in centipawns
+MOBILITYWEIGHT = 2
+DOUBLEDWEIGHT = -12
+ISOLATEDWEIGHT = -10
+PASSEDWEIGHT = 25
+
+_MIDGAMETABLE = np.array(Evaluation.MIDGAMETABLE, dtype=np.int32)
+_ENDGAMETABLE = np.array(Evaluation.ENDGAMETABLE, dtype=np.int32)
+_PHASEWEIGHTS = np.array(Evaluation.PHASEWEIGHTS, dtype=np.int32)
+_SQUARES = np.arange(64)
+
+#Piece value of each of the 12 planes: white pawn, knight, bishop, rook, queen, king then the same for black
+PLANEPIECES = np.array([colour.value + piece.value for colour in (Piece.WHITE, Piece.BLACK)
+    for piece in (Piece.PAWN, Piece.KNIGHT, Piece.BISHOP, Piece.ROOK, Piece.QUEEN, Piece.KING)], dtype=np.int8)
+
+_FULL = np.uint64(Bitboard.FULL)
+_NOTAFILE = np.uint64(Bitboard.FULL ^ 0x0101_0101_0101_0101)
+_NOTHFILE = np.uint64(Bitboard.FULL ^ 0x8080_8080_8080_8080)
+_NOTABFILE = np.uint64(Bitboard.FULL ^ 0x0303_0303_0303_0303)
+_NOTGHFILE = np.uint64(Bitboard.FULL ^ 0xC0C0_C0C0_C0C0_C0C0)
+
+#(square offset, mask of squares a shift by it can land on without wrapping around the board)
+_KNIGHTSHIFTS = ((17, _NOTAFILE), (15, _NOTHFILE), (10, _NOTABFILE), (6, _NOTGHFILE), (-6, _NOTABFILE), (-10, _NOTGHFILE), (-15, _NOTAFILE), (-17, _NOTHFILE))
+_BISHOPSHIFTS = ((9, _NOTAFILE), (7, _NOTHFILE), (-7, _NOTAFILE), (-9, _NOTHFILE))
+_ROOKSHIFTS = ((8, _FULL), (-8, _FULL), (1, _NOTAFILE), (-1, _NOTHFILE))
+
+def pack(boards) -> tuple[np.ndarray, np.ndarray]:
+    """(squares, whiteToMove): an N x 64 int8 array of the boards' piece values and an N bool array of the side to move"""
+    boards = list(boards)
+    squares = np.frombuffer(bytearray().join(board.board for board in boards), dtype=np.int8)
+    whiteToMove = np.fromiter((board.colourToMove == Piece.WHITE for board in boards), dtype=bool, count=len(boards))
+    return squares.reshape(len(boards), 64), whiteToMove
+
+#FEN placement characters to piece value bytes, a digit becomes that many empty squares
+_FENTRANSLATION = str.maketrans({**{str(count): "\0" * count for count in range(1, 9)},
+    **{char: chr((Piece.WHITE.value if char.isupper() else Piece.BLACK.value) + piece.value)
+        for piece, letter in ((Piece.PAWN, "p"), (Piece.KNIGHT, "n"), (Piece.BISHOP, "b"), (Piece.ROOK, "r"), (Piece.QUEEN, "q"), (Piece.KING, "k"))
+        for char in (letter, letter.upper())}})
+
+def packFENs(FENs) -> tuple[np.ndarray, np.ndarray]:
+    """Packs FEN Strings like pack. Only the placement and side to move are read, without building a Board for each"""
+    rows = []
+    sides = []
+    for FEN in FENs:
+        placement, turn = FEN.split(None, 2)[:2]
+        row = "".join(reversed(placement.split("/"))).translate(_FENTRANSLATION).encode("latin-1") #FEN starts from rank 8
+        if len(row) != 64:
+            raise ValueError(f"Invalid FEN String - Invalid piece placement: {FEN}")
+        rows.append(row)
+        sides.append(turn == "w")
+    squares = np.frombuffer(b"".join(rows), dtype=np.int8).reshape(len(rows), 64)
+    return squares, np.array(sides, dtype=bool)
+
+def planes(squares : np.ndarray) -> np.ndarray:
+    """N x 12 x 64 bool one-hot planes of an N x 64 packed batch, ordered as PLANEPIECES"""
+    return squares[:, None, :] == PLANEPIECES[None, :, None]
+
+def bitboards(squares : np.ndarray, mask : np.ndarray) -> np.ndarray:
+    """N uint64 bitboards (bit n set for square n, as in Bitboard) of an N x 64 bool mask"""
+    return np.packbits(mask, axis=1, bitorder="little").view("<u8").ravel()
+
+def _shiftBits(bits : np.ndarray, offset : int) -> np.ndarray:
+    return bits << np.uint64(offset) if offset > 0 else bits >> np.uint64(-offset)
+
+def _slidingFill(sliders : np.ndarray, empty : np.ndarray, offset : int, mask : np.ndarray) -> np.ndarray:
+    """Squares attacked in one direction by every slider at once (Kogge-Stone fill), up to and including the first occupied square"""
+    empty = empty & mask
+    sliders = sliders | (empty & _shiftBits(sliders, offset))
+    empty = empty & _shiftBits(empty, offset)
+    sliders = sliders | (empty & _shiftBits(sliders, 2 * offset))
+    empty = empty & _shiftBits(empty, 2 * offset)
+    sliders = sliders | (empty & _shiftBits(sliders, 4 * offset))
+    return _shiftBits(sliders, offset) & mask
+
+def _mobility(squares : np.ndarray, empty : np.ndarray, colour : int) -> np.ndarray:
+    """Attacked squares not holding own pieces, summed over the knights and sliders of colour.
+    Works on whole sets of pieces, which counts the same as adding up piece by piece: knights of one set landing on
+    a square by the same offset can't overlap, nor can the rays of sliders in one direction (the first blocks the rest)"""
+    notOwn = ~bitboards(squares, (squares & 0b011000) == colour)
+    count = np.zeros(len(squares), dtype=np.int32)
+
+    knights = bitboards(squares, squares == colour + Piece.KNIGHT.value)
+    for offset, mask in _KNIGHTSHIFTS:
+        count += np.bitwise_count(_shiftBits(knights, offset) & mask & notOwn)
+
+    queens = squares == colour + Piece.QUEEN.value
+    for sliders, shifts in ((bitboards(squares, (squares == colour + Piece.BISHOP.value) | queens), _BISHOPSHIFTS),
+            (bitboards(squares, (squares == colour + Piece.ROOK.value) | queens), _ROOKSHIFTS)):
+        for offset, mask in shifts:
+            count += np.bitwise_count(_slidingFill(sliders, empty, offset, mask) & notOwn)
+    return count
+
+def _fileFill(bits : np.ndarray, offset : int) -> np.ndarray:
+    """bits smeared along their files in the direction of offset (8 up the board, -8 down)"""
+    bits = bits | _shiftBits(bits, offset)
+    bits = bits | _shiftBits(bits, 2 * offset)
+    return bits | _shiftBits(bits, 4 * offset)
+
+def _pawnStructure(pawns : np.ndarray, enemyPawns : np.ndarray, forward : int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(doubled, isolated, passed) counts of pawns, a bitboard array moving forward (8 for white, -8 for black)"""
+    files = _fileFill(_fileFill(pawns, 8), -8)
+    total = np.bitwise_count(pawns)
+    doubled = total - np.bitwise_count(files & np.uint64(0xFF)) #Pawns beyond the first on their file
+    neighbours = ((files << np.uint64(1)) & _NOTAFILE) | ((files >> np.uint64(1)) & _NOTHFILE)
+    isolated = np.bitwise_count(pawns & ~neighbours)
+
+    #Squares behind enemy pawns (from the enemy's view) on their file and the neighbouring ones can't hold a passed pawn
+    span = _fileFill(_shiftBits(enemyPawns, -forward), -forward)
+    blocked = span | ((span << np.uint64(1)) & _NOTAFILE) | ((span >> np.uint64(1)) & _NOTHFILE)
+    passed = np.bitwise_count(pawns & ~blocked)
+    return doubled, isolated, passed
+
+def features(squares : np.ndarray) -> dict[str, np.ndarray]:
+    """Every feature of an N x 64 packed batch as N int32 arrays, from white's point of view"""
+    midgame = _MIDGAMETABLE[squares, _SQUARES].sum(axis=1, dtype=np.int32)
+    endgame = _ENDGAMETABLE[squares, _SQUARES].sum(axis=1, dtype=np.int32)
+    phase = _PHASEWEIGHTS[squares & 0b000111].sum(axis=1, dtype=np.int32)
+
+    empty = bitboards(squares, squares == 0)
+    mobility = _mobility(squares, empty, Piece.WHITE.value) - _mobility(squares, empty, Piece.BLACK.value)
+
+    whitePawns = bitboards(squares, squares == Piece.WHITE.value + Piece.PAWN.value)
+    blackPawns = bitboards(squares, squares == Piece.BLACK.value + Piece.PAWN.value)
+    white = _pawnStructure(whitePawns, blackPawns, 8)
+    black = _pawnStructure(blackPawns, whitePawns, -8)
+    doubled, isolated, passed = (w.astype(np.int32) - b for w, b in zip(white, black))
+
+    return {"midgame": midgame, "endgame": endgame, "phase": phase, "mobility": mobility.astype(np.int32),
+        "doubled": doubled.astype(np.int32), "isolated": isolated.astype(np.int32), "passed": passed.astype(np.int32)}
+
+def evaluateBatch(squares : np.ndarray, whiteToMove : np.ndarray = None) -> np.ndarray:
+    """Scores of an N x 64 packed batch in centipawns, from white's point of view,
+    or from the side to move's if whiteToMove is given (as Evaluation.evaluate)"""
+    terms = features(squares)
+    phase = np.minimum(terms["phase"], Evaluation.PHASETOTAL)
+    score = (terms["midgame"] * phase + terms["endgame"] * (Evaluation.PHASETOTAL - phase)) // Evaluation.PHASETOTAL
+    score += MOBILITYWEIGHT * terms["mobility"] + DOUBLEDWEIGHT * terms["doubled"] + ISOLATEDWEIGHT * terms["isolated"] + PASSEDWEIGHT * terms["passed"]
+    if whiteToMove is not None:
+        score = np.where(whiteToMove, score, -score)
+    return score
+
+def randomPositions(count : int, seed : int = 0, maxPlies : int = 60) -> list[str]:
+    """FEN Strings of count positions reached by random legal moves from the start position"""
+    rng = random.Random(seed)
+    board = GameBoard.Board()
+    positions = []
+    while len(positions) < count:
+        board.setPosition(None)
+        for _ in range(rng.randrange(maxPlies)):
+            moves = board.generateLegalMoves()
+            if not moves:
+                break
+            board.makeMove(rng.choice(moves))
+        positions.append(board.toFEN())
+    return positions
+
+def scalarFeatures(board : GameBoard.Board) -> dict[str, int]:
+    """The features of one Board, computed square by square with Bitboard's tables, to check features against"""
+    result = {"midgame": board.midgameScore, "endgame": board.endgameScore, "phase": board.phase, "mobility": 0,
+        "doubled": 0, "isolated": 0, "passed": 0}
+    occupancy = board.occupied
+    for colour, sign in ((Piece.WHITE.value, 1), (Piece.BLACK.value, -1)):
+        notOwn = ~board.colourOccupancy[colour >> 4] & Bitboard.FULL
+        for pieceType, attacks in ((Piece.KNIGHT.value, lambda square: Bitboard.KNIGHTATTACKS[square]),
+                (Piece.BISHOP.value, lambda square: Bitboard.bishopAttacks(square, occupancy)),
+                (Piece.ROOK.value, lambda square: Bitboard.rookAttacks(square, occupancy)),
+                (Piece.QUEEN.value, lambda square: Bitboard.queenAttacks(square, occupancy))):
+            for square in range(64):
+                if board.board[square] == colour + pieceType:
+                    result["mobility"] += sign * (attacks(square) & notOwn).bit_count()
+
+        pawns = [divmod(square, 8) for square in range(64) if board.board[square] == colour + Piece.PAWN.value]
+        enemyPawns = [divmod(square, 8) for square in range(64) if board.board[square] == (colour ^ 0b11000) + Piece.PAWN.value]
+        files = {file for _, file in pawns}
+        result["doubled"] += sign * (len(pawns) - len(files))
+        for rank, file in pawns:
+            if file - 1 not in files and file + 1 not in files:
+                result["isolated"] += sign
+            #Passed if no enemy pawn is ahead of it on its own or a neighbouring file
+            if not any(abs(enemyFile - file) <= 1 and (enemyRank - rank) * sign > 0 for enemyRank, enemyFile in enemyPawns):
+                result["passed"] += sign
+    return result
+
+def runCheck(count : int, seed : int = 0) -> bool:
+    """Compares features of count random positions, packed both by pack and packFENs, with scalarFeatures.
+    Prints every mismatch and returns True if there was none"""
+    FENs = randomPositions(count, seed)
+    boards = [GameBoard.Board(FEN) for FEN in FENs]
+    squares, whiteToMove = pack(boards)
+    fromFENs, fromFENsToMove = packFENs(FENs)
+    allPassed = bool(np.array_equal(squares, fromFENs) and np.array_equal(whiteToMove, fromFENsToMove))
+    if not allPassed:
+        print("FAIL packFENs differs from pack")
+
+    terms = features(squares)
+    for index, board in enumerate(boards):
+        for name, expected in scalarFeatures(board).items():
+            if terms[name][index] != expected:
+                allPassed = False
+                print(f"FAIL {name:<8} {terms[name][index]:>6} (expected {expected:>6}) {FENs[index]}")
+    print(f"{'ok  ' if allPassed else 'FAIL'} {len(FENs)} positions checked")
+    return allPassed
+
+def main():
+    parser = argparse.ArgumentParser(description="Scores many positions at once with NumPy")
+    parser.add_argument("input", nargs="?", help="File of FEN Strings, one per line (- for stdin)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--bench", type=int, metavar="N", help="Time scoring N random positions instead")
+    mode.add_argument("--check", type=int, metavar="N", help="Check the features of N random positions against scalarFeatures instead")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(0 if runCheck(args.check) else 1)
+
+    if args.bench:
+        FENs = randomPositions(min(args.bench, 1000))
+        FENs = (FENs * (args.bench // len(FENs) + 1))[:args.bench] #Repeated, generating positions is slower than scoring them
+        start = time.perf_counter()
+        squares, whiteToMove = packFENs(FENs)
+        packed = time.perf_counter()
+        evaluateBatch(squares, whiteToMove)
+        scored = time.perf_counter()
+        print(f"Packed {len(FENs)} positions in {packed - start:.2f}s ({len(FENs) / (packed - start):.0f} positions/s)")
+        print(f"Scored {len(FENs)} positions in {scored - packed:.2f}s ({len(FENs) / (scored - packed):.0f} positions/s)")
+        return
+
+    source = sys.stdin if args.input in (None, "-") else open(args.input)
+    FENs = [line.strip() for line in source if line.strip()]
+    squares, whiteToMove = packFENs(FENs)
+    for FEN, score in zip(FENs, evaluateBatch(squares, whiteToMove)):
+        print(f"{score:6d} {FEN}")
+
+if __name__ == "__main__":
+    main()
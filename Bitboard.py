@@ -0,0 +1,192 @@
+"""Precomputed bitboard tables used by GameBoard.Board
+
+Squares are numbered 0 - 63 with a1 = 0, h1 = 7 and h8 = 63 (square = rank * 8 + file).
+A bitboard is a python int where bit n is set if square n is part of the set.
+"""
+import random
+
+FULL = 0xFFFF_FFFF_FFFF_FFFF
+DARKSQUARES = 0xAA55_AA55_AA55_AA55 #a1 is dark
+BACKRANKS = 0xFF00_0000_0000_00FF #Ranks 1 and 8
+
+KNIGHTOFFSETS = ((-2,-1), (-2,1), (-1,-2), (-1,2),
+                 (1,-2), (1, 2), (2, 1), (2, -1))
+KINGOFFSETS = ((-1,-1),(-1,1),(1, -1),(1, 1),
+               (-1,0), (0, -1), (0, 1), (1, 0))
+BISHOPDIRECTIONS = ((-1,-1),(-1,1),(1, -1),(1, 1))
+ROOKDIRECTIONS = ((-1,0), (0, -1), (0, 1), (1, 0))
+
+def squareBit(rank, file) -> int:
+    return 1 << (rank * 8 + file)
+
+def bitScan(bitboard : int) -> int:
+    """Returns the index of the least significant set bit"""
+    return (bitboard & -bitboard).bit_length() - 1
+
+def popCount(bitboard : int) -> int:
+    return bitboard.bit_count()
+
+def squares(bitboard : int) -> list[int]:
+    """Returns every set square of bitboard, lowest first"""
+    result = []
+    while bitboard:
+        lsb = bitboard & -bitboard
+        result.append(lsb.bit_length() - 1)
+        bitboard ^= lsb
+    return result
+
+def _stepAttacks(offsets) -> tuple[int]:
+    attacks = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        bitboard = 0
+        for rankChange, fileChange in offsets:
+            if 0 <= rank + rankChange <= 7 and 0 <= file + fileChange <= 7:
+                bitboard |= squareBit(rank + rankChange, file + fileChange)
+        attacks.append(bitboard)
+    return tuple(attacks)
+
+def slidingAttacks(square : int, occupancy : int, directions) -> int:
+    """Slow ray walk used to fill the magic tables. Rays stop at (and include) the first occupied square"""
+    rank, file = divmod(square, 8)
+    bitboard = 0
+    for rankChange, fileChange in directions:
+        newRank, newFile = rank + rankChange, file + fileChange
+        while 0 <= newRank <= 7 and 0 <= newFile <= 7:
+            bit = squareBit(newRank, newFile)
+            bitboard |= bit
+            if occupancy & bit:
+                break
+            newRank += rankChange
+            newFile += fileChange
+    return bitboard
+
+def relevantOccupancy(square : int, directions) -> int:
+    """Squares along each ray whose occupancy changes the attack set (the board edge never does)"""
+    rank, file = divmod(square, 8)
+    bitboard = 0
+    for rankChange, fileChange in directions:
+        newRank, newFile = rank + rankChange, file + fileChange
+        while 0 <= newRank + rankChange <= 7 and 0 <= newFile + fileChange <= 7:
+            bitboard |= squareBit(newRank, newFile)
+            newRank += rankChange
+            newFile += fileChange
+    return bitboard
+
+def occupancySubsets(mask : int):
+    """Carry-Rippler enumeration of every subset of mask"""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return
+
+def findMagic(square : int, directions, rng : random.Random, tries : int = 10_000_000) -> int:
+    """Searches for a magic number mapping every relevant occupancy of square to a collision free index.
+    Only used to regenerate ROOKMAGICS / BISHOPMAGICS"""
+    mask = relevantOccupancy(square, directions)
+    shift = 64 - popCount(mask)
+    subsets = [(occupancy, slidingAttacks(square, occupancy, directions)) for occupancy in occupancySubsets(mask)]
+    for _ in range(tries):
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64) #Sparse candidates work best
+        if popCount((mask * magic) & 0xFF00_0000_0000_0000) < 6:
+            continue
+        used = {}
+        for occupancy, attacks in subsets:
+            index = ((occupancy * magic) & FULL) >> shift
+            if used.setdefault(index, attacks) != attacks:
+                break
+        else:
+            return magic
+    raise RuntimeError(f"No magic found for square {square}")
+
+def _buildMagicTable(directions, magics):
+    masks, shifts, tables = [], [], []
+    for square in range(64):
+        mask = relevantOccupancy(square, directions)
+        shift = 64 - popCount(mask)
+        table = [0] * (1 << (64 - shift))
+        for occupancy in occupancySubsets(mask):
+            table[((occupancy * magics[square]) & FULL) >> shift] = slidingAttacks(square, occupancy, directions)
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return tuple(masks), tuple(shifts), tuple(tables)
+
+#Found with findMagic and random.Random(20241017), rooks first
+ROOKMAGICS = (
+    0x0900110080004022, 0x0040200040001000, 0xC080081000802000, 0x0880041000800800,
+    0x0700080010040300, 0x0180040001801200, 0x08800B0002002480, 0x0900002100008042,
+    0x401080002040008C, 0x0000400020005000, 0x9411002004104501, 0x0404800800100180,
+    0x0001000800041100, 0x0048808002000400, 0x042A0008043A0001, 0x3022000040840102,
+    0xA000908000204001, 0x0010810021004000, 0x0400410020071100, 0x0C03010008221000,
+    0x0008808008020400, 0x4004808004000200, 0x0000040002018810, 0x2204520000804401,
+    0x8000800080204008, 0x0010004040002000, 0x0006104100200104, 0x0201000900201001,
+    0x1021008500100800, 0x0001000900040002, 0xC811010080800200, 0x0083800080007100,
+    0x2084244004800080, 0x0250014001402002, 0x5130200080801000, 0x0200081001002100,
+    0x0000802801800401, 0x0000800400800200, 0x00021802240010C1, 0x0012004402000081,
+    0x00C0400020808003, 0x8228200050084004, 0x00A0820010420020, 0x0040400822020010,
+    0x0008040008008080, 0x8002000400808002, 0x1000040200010100, 0x0004808908620004,
+    0x0802A101C0800300, 0x8000200080401080, 0x0401200903104100, 0x0000200A00401200,
+    0x3100080080040280, 0x3004008004020080, 0x4428028130080400, 0x0000440081004200,
+    0x0024800101322441, 0x0941210012088242, 0x204A000810208042, 0x0002001008044022,
+    0x0001003008000423, 0x8041000204000801, 0x0000460810188104, 0x0528058900403402,
+)
+
+BISHOPMAGICS = (
+    0x0110041004002022, 0x0004080800409050, 0x00106884810A4026, 0x02020A0A00000008,
+    0x0082021040000448, 0x400E025004130C04, 0x0000480808080008, 0x0802020212010401,
+    0x0000042004040886, 0x8350083008EA0041, 0x880031440404400A, 0x000130B082008008,
+    0x2010020210280412, 0x0840008804420005, 0x0C08020110382409, 0x4005002084042061,
+    0x001000400242B400, 0x0A48000488080044, 0x4082000106040900, 0x2204000802122080,
+    0x0016200400A00042, 0x001A800640602000, 0x0506240108012404, 0x0181008224014404,
+    0x00080800200210A6, 0x80904414904C8280, 0x0025010010184200, 0x0002008008008003,
+    0x86008400A8802000, 0x0000410102010100, 0x8002008C42445001, 0x088A120044410081,
+    0x0104214800A01200, 0xA610A82020080208, 0x0002004048040500, 0x0008020080880080,
+    0x0045020400360500, 0x0084900080230280, 0x8001490400210C00, 0x0001026284220200,
+    0x0001100804092000, 0x0900420820010400, 0xA412030401040201, 0x0060002011100801,
+    0x0280080104010040, 0x4002081008200100, 0x8008010404058080, 0x0001140082000083,
+    0x0002020202400000, 0x2902009084104801, 0x0100942084100000, 0x0084202084040200,
+    0xC800104005010208, 0xC406102208084400, 0x0005880204040000, 0x6509102400802100,
+    0x0205002B100E1001, 0x0440422C01041000, 0x0404804201208850, 0x0090000000842410,
+    0x9040800042082208, 0x0024014010020A22, 0x0040104408880040, 0x0008101000410020,
+)
+
+KNIGHTATTACKS = _stepAttacks(KNIGHTOFFSETS)
+KINGATTACKS = _stepAttacks(KINGOFFSETS)
+#PAWNATTACKS[0] are the squares a white pawn attacks, PAWNATTACKS[1] for a black pawn
+PAWNATTACKS = (_stepAttacks(((1,-1), (1,1))), _stepAttacks(((-1,-1), (-1,1))))
+
+ROOKMASKS, ROOKSHIFTS, ROOKTABLE = _buildMagicTable(ROOKDIRECTIONS, ROOKMAGICS)
+BISHOPMASKS, BISHOPSHIFTS, BISHOPTABLE = _buildMagicTable(BISHOPDIRECTIONS, BISHOPMAGICS)
+
+def rookAttacks(square : int, occupancy : int) -> int:
+    return ROOKTABLE[square][(((occupancy & ROOKMASKS[square]) * ROOKMAGICS[square]) & FULL) >> ROOKSHIFTS[square]]
+
+def bishopAttacks(square : int, occupancy : int) -> int:
+    return BISHOPTABLE[square][(((occupancy & BISHOPMASKS[square]) * BISHOPMAGICS[square]) & FULL) >> BISHOPSHIFTS[square]]
+
+def queenAttacks(square : int, occupancy : int) -> int:
+    return rookAttacks(square, occupancy) | bishopAttacks(square, occupancy)
+
+def _buildRayTables():
+    """BETWEEN[a][b] holds the squares strictly between a and b, LINE[a][b] the full line through both (0 if not aligned)"""
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        for rankChange, fileChange in ROOKDIRECTIONS + BISHOPDIRECTIONS:
+            fullLine = slidingAttacks(square, 0, ((rankChange, fileChange), (-rankChange, -fileChange))) | (1 << square)
+            passed = 0
+            newRank, newFile = rank + rankChange, file + fileChange
+            while 0 <= newRank <= 7 and 0 <= newFile <= 7:
+                target = newRank * 8 + newFile
+                between[square][target] = passed
+                line[square][target] = fullLine
+                passed |= 1 << target
+                newRank += rankChange
+                newFile += fileChange
+    return tuple(map(tuple, between)), tuple(map(tuple, line))
+
+BETWEEN, LINE = _buildRayTables()
@@ -0,0 +1,138 @@
+"""Headless board diagrams: renders FEN positions to PNG files across a process pool, without opening a window
+
+Each worker sets up pygame with the dummy video driver once, then draws every position onto a copy of one cached
+background with the shared piece images of BoardVisualizer, so nothing is loaded or scaled per image.
+
+Input has one position per line: a FEN String, optionally followed by moves to draw as arrows, e.g.
+    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 e2e4 g1f3
+Blank lines and # comments are skipped. Image N (counting positions from 0) is written to OUTPUT/000N.png.
+
+Usage:
+    python BoardRenderer.py [INPUT] -o OUTPUT [--size PIXELS] [--workers N]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pygame
+import GameBoard
+from BatchAnalysis import readPositions, mapChunks
+from BoardVisualizer import CELLSIZE, boardBackground, pieceImage, loadPieceImages
+
+ARROWCOLOUR = (255,170,0)
+CHUNKSIZE = 32 #Positions sent to a worker at once
+
+def initRenderer(size : int = CELLSIZE):
+    """Sets up pygame without a window and loads the piece images, once per process"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #Read when the display is initialised
+    pygame.display.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1)) #Images are converted to the display's pixel format, so one has to exist
+    loadPieceImages(size)
+
+def parseLine(line : str) -> tuple[str, list[str]]:
+    """Splits an input line into its FEN String and the moves (e.g. "e2e4") to draw as arrows"""
+    fields = line.split()
+    if len(fields) < 6:
+        raise ValueError(f"Invalid position: {line}")
+    return " ".join(fields[:6]), fields[6:]
+
+def squareCentre(square : int, size : int) -> tuple[int, int]:
+    rank, file = divmod(square, 8)
+    return (file * size + size // 2, (7 - rank) * size + size // 2)
+
+def drawArrow(surface : pygame.Surface, original : int, target : int, size : int):
+    """Draws an arrow from the centre of original to the centre of target"""
+    start = squareCentre(original, size)
+    end = squareCentre(target, size)
+    angle = math.atan2(end[1] - start[1], end[0] - start[0])
+    headLength = size * 0.35
+    #The shaft stops where the head starts so its end doesn't poke out of the point
+    shaftEnd = (end[0] - math.cos(angle) * headLength, end[1] - math.sin(angle) * headLength)
+    pygame.draw.line(surface, ARROWCOLOUR, start, shaftEnd, max(2, size // 8))
+    head = [end]
+    for side in (-1, 1):
+        head.append((shaftEnd[0] + math.cos(angle + side * math.pi / 2) * headLength * 0.6,
+                     shaftEnd[1] + math.sin(angle + side * math.pi / 2) * headLength * 0.6))
+    pygame.draw.polygon(surface, ARROWCOLOUR, head)
+
+def renderPosition(board : GameBoard.Board, FEN : str, arrows = (), size : int = CELLSIZE, background : pygame.Surface = None) -> pygame.Surface:
+    """Draws the position of FEN with a size x size image per square, and an arrow for every move of arrows.
+    board is only used to read the FEN, background a cached boardBackground(size)"""
+    squares = board.renderFEN(FEN)[0]
+    surface = (background or boardBackground(size)).copy()
+    for square, piece in enumerate(squares):
+        if piece:
+            rank, file = divmod(square, 8)
+            surface.blit(pieceImage(piece, size), (file * size, (7 - rank) * size))
+    for move in arrows:
+        drawArrow(surface, GameBoard.Board.algebraicNotationToSquare(move[:2]), GameBoard.Board.algebraicNotationToSquare(move[2:4]), size)
+    return surface
+
+#Worker globals, see _initWorker
+_board = None
+_background = None
+_size = None
+_outputDirectory = None
+
+def _initWorker(size : int, outputDirectory : str):
+    global _board, _background, _size, _outputDirectory
+    initRenderer(size)
+    _board = GameBoard.Board()
+    _background = boardBackground(size)
+    _size = size
+    _outputDirectory = outputDirectory
+
+def _renderChunk(chunk : list[tuple[int, str]]) -> list[tuple[int, str]]:
+    """Renders and saves every (index, line) of chunk. Returns (index, error) for every line, error is None if it was rendered"""
+    results = []
+    for index, line in chunk:
+        try:
+            FEN, arrows = parseLine(line)
+            surface = renderPosition(_board, FEN, arrows, _size, _background)
+        except ValueError as error:
+            results.append((index, str(error)))
+            continue
+        pygame.image.save(surface, os.path.join(_outputDirectory, f"{index:06d}.png"))
+        results.append((index, None))
+    return results
+
+def renderStream(lines, outputDirectory : str, size : int = CELLSIZE, workers : int = None) -> tuple[int, list[tuple[int, str]]]:
+    """Renders every position line of lines to outputDirectory. Returns the number of positions and the (index, error)
+    of the ones that failed"""
+    os.makedirs(outputDirectory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    positions = 0
+    errors = []
+    with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(size, outputDirectory)) as pool:
+        for results in mapChunks(pool, _renderChunk, readPositions(lines), workers, CHUNKSIZE):
+            positions += len(results)
+            errors += [(index, error) for index, error in results if error is not None]
+    return positions, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders FEN positions to PNG board diagrams without opening a window")
+    parser.add_argument("input", nargs="?", default="-", help="One FEN per line, optionally followed by moves to draw as arrows, stdin if omitted or -")
+    parser.add_argument("-o", "--output", required=True, help="Directory to write the images to")
+    parser.add_argument("--size", type=int, default=CELLSIZE, metavar="PIXELS", help="Size of a square")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default one per core)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    start = time.perf_counter()
+    try:
+        positions, errors = renderStream(source, args.output, args.size, args.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - start
+
+    for index, error in errors:
+        print(f"Position {index}: {error}", file=sys.stderr)
+    rendered = positions - len(errors)
+    print(f"Rendered {rendered} images in {elapsed:.2f}s, {rendered / elapsed:.1f} images/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import argparse
+import os
 import pygame
 import GameBoard
+from Analysis import Analysis
 from sys import exit
 
 BLACKCELLCOLOUR = (115,149,82)
@@ -9,42 +12,55 @@ BLACKMOVECOLOUR = (176,39,47)
 WHITEMOVECOLOUR = (222,61,75)
 PROMOTIONBOXCOLOUR = (255,255,255)
 PROMOTIONCLOSECOLOUR = (241,241,241)
+ANALYSISCOLOUR = (66,135,245)
+ANALYSISBORDER = 6
+
+#King target square of a castling move -> (rook original square, rook target square)
+CASTLINGROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+PIECEDIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pieces")
+PIECENAMES = {GameBoard.Piece.PAWN.value: "Pawn", GameBoard.Piece.KING.value: "King", GameBoard.Piece.KNIGHT.value: "Knight",
+    GameBoard.Piece.BISHOP.value: "Bishop", GameBoard.Piece.ROOK.value: "Rook", GameBoard.Piece.QUEEN.value: "Queen"}
+
+#Piece images shared by every sprite and board: each file is loaded once, and scaled once per size
+_sourceImages = {} #Piece value -> image as loaded
+_scaledImages = {} #(piece value, size) -> image scaled to size x size
+
+def pieceImage(piece : int, size : int = CELLSIZE) -> pygame.Surface:
+    """Image of piece scaled to size x size. Needs the display to be set up, the image is converted to its pixel format"""
+    key = (piece, size)
+    if (image := _scaledImages.get(key)) is None:
+        if (source := _sourceImages.get(piece)) is None:
+            name = PIECENAMES.get(GameBoard.Piece.pieceType(piece))
+            if name is None:
+                raise ValueError("Unknown Piece Type")
+            colour = "Dark" if GameBoard.Piece.isColour(piece, GameBoard.Piece.BLACK) else "Light"
+            source = _sourceImages[piece] = pygame.image.load(os.path.join(PIECEDIRECTORY, f"{colour}{name}.png")).convert_alpha()
+        image = _scaledImages[key] = pygame.transform.scale(source, (size, size))
+    return image
+
+def loadPieceImages(size : int = CELLSIZE):
+    """Loads and scales all twelve piece images up front, so no sprite waits on the disk later"""
+    for colour in (GameBoard.Piece.WHITE.value, GameBoard.Piece.BLACK.value):
+        for pieceType in PIECENAMES:
+            pieceImage(colour + pieceType, size)
+
+def boardBackground(size : int = CELLSIZE) -> pygame.Surface:
+    """The empty board with size x size squares, drawn once and blitted from whenever squares are redrawn"""
+    background = pygame.Surface((size * 8, size * 8)).convert()
+    for file in range(8):
+        for rank in range(8):
+            cellColour = WHITECELLCOLOUR if (file + rank) % 2 == 0 else BLACKCELLCOLOUR
+            background.fill(cellColour, (size * file, size * rank, size, size))
+    return background
 
 class GamePiece(pygame.sprite.Sprite):
     def __init__(self, rank, file, pieceType : int):
         super().__init__()
-        self.__type = 0
+        colour = GameBoard.Piece.BLACK.value if GameBoard.Piece.isColour(pieceType, GameBoard.Piece.BLACK) else GameBoard.Piece.WHITE.value
+        self.__type = colour | GameBoard.Piece.pieceType(pieceType)
 
-        if GameBoard.Piece.isColour(pieceType, GameBoard.Piece.BLACK):
-            imageName = "Dark"
-            self.__type |= GameBoard.Piece.BLACK.value
-        else:
-            imageName = "Light"
-            self.__type |= GameBoard.Piece.WHITE.value
-
-        match GameBoard.Piece.pieceType(pieceType):
-            case GameBoard.Piece.PAWN.value:
-                imageName += "Pawn.png"
-                self.__type |= GameBoard.Piece.PAWN.value
-            case GameBoard.Piece.KING.value:
-                imageName += "King.png"
-                self.__type |= GameBoard.Piece.KING.value
-            case GameBoard.Piece.KNIGHT.value:
-                imageName += "Knight.png"
-                self.__type |= GameBoard.Piece.KNIGHT.value
-            case GameBoard.Piece.BISHOP.value:
-                imageName += "Bishop.png"
-                self.__type |= GameBoard.Piece.BISHOP.value
-            case GameBoard.Piece.ROOK.value:
-                imageName += "Rook.png"
-                self.__type |= GameBoard.Piece.ROOK.value
-            case GameBoard.Piece.QUEEN.value:
-                imageName += "Queen.png"
-                self.__type |= GameBoard.Piece.QUEEN.value
-            case _:
-                raise ValueError("Unknown Piece Type")
-            
-        self.image = pygame.transform.scale(pygame.image.load(f"pieces\{imageName}"), (CELLSIZE, CELLSIZE))
+        self.image = pieceImage(self.__type)
         self.rect = self.image.get_rect()
         self.setPos(rank, file)
 
@@ -58,43 +74,84 @@ class GamePiece(pygame.sprite.Sprite):
     
     def getPos(self):
         return (self.__rank, self.__file)
+
+    def getSquare(self):
+        return self.__rank * 8 + self.__file
     
     def getType(self):
         return self.__type
 
 class BoardVisualizer(GameBoard.Board):
-    def __init__(self, FEN=None):
+    def __init__(self, FEN=None, analysis : bool = False):
         super().__init__(FEN)
         self.screen = pygame.display.set_mode((CELLSIZE*8,CELLSIZE*8))
         pygame.display.set_caption("Chess!")
         self.clock = pygame.time.Clock()
+        loadPieceImages()
 
         self.canShowMoves = True
         self.choosingPromotions = False
         self.showingPieceMove = None
         self.promotionRects = None
 
+        #Incremental rendering: only the squares in dirtySquares are redrawn (from the background, their highlight and
+        #their piece) and only their rects are sent to the display
+        self.background = boardBackground()
+        self.dirtySquares = set()
+        self.highlightedSquares = {} #Square -> colour of the move highlights being shown
+        #Lookups by square so clicks don't scan every sprite or move: the sprite on each square, and the moves of
+        #the selected piece by target square
+        self.spriteAt = [None] * 64
+        self.curMoveMap = {}
+        #Live analysis from a worker process: its best move's squares are outlined, the rest is shown in the caption
+        self.analysis = Analysis() if analysis else None
+        self.analysisSquares = ()
+
         self.renderBaseBoard(False)
         self.pieceList = self.initPieces()
         self.pieceList.draw(self.screen)
         pygame.display.update()
+        if self.analysis:
+            self.analysis.analyse(self.toFEN())
 
     def renderBaseBoard(self, update=True):
-        rectList = []
-        for file in range(8):
-            for rank in range(8):
-                cellColour = WHITECELLCOLOUR if (file + rank) % 2 == 0 else BLACKCELLCOLOUR
-                rectList.append(pygame.draw.rect(self.screen, cellColour, (CELLSIZE * file, CELLSIZE * rank, CELLSIZE, CELLSIZE)))
+        self.screen.blit(self.background, (0, 0))
         if update:
-            pygame.display.update(rectList)
+            pygame.display.update()
+
+    def squareRect(self, square : int) -> pygame.Rect:
+        rank, file = divmod(square, 8)
+        return pygame.Rect(CELLSIZE * file, CELLSIZE * (7 - rank), CELLSIZE, CELLSIZE)
+
+    def markDirty(self, *squares : int):
+        self.dirtySquares.update(squares)
+
+    def renderDirty(self):
+        """Redraws the dirty squares and updates only their part of the display"""
+        if not self.dirtySquares:
+            return
+        rectList = []
+        for square in self.dirtySquares:
+            rect = self.squareRect(square)
+            self.screen.blit(self.background, rect, rect)
+            if cellColour := self.highlightedSquares.get(square):
+                self.screen.fill(cellColour, rect)
+            if square in self.analysisSquares:
+                pygame.draw.rect(self.screen, ANALYSISCOLOUR, rect, ANALYSISBORDER)
+            rectList.append(rect)
+        for square in self.dirtySquares:
+            if piece := self.spriteAt[square]:
+                self.screen.blit(piece.image, piece.rect)
+        self.dirtySquares.clear()
+        pygame.display.update(rectList)
 
     def initPieces(self):
         pieceList = pygame.sprite.Group()
-        for rank, row in enumerate(self.board):
-            for file, cell in enumerate(row):
-                if cell != 0:
-                    newPiece = GamePiece((7 - rank), file, cell)
-                    pieceList.add(newPiece)
+        for square, cell in enumerate(self.board):
+            if cell != 0:
+                newPiece = GamePiece(square // 8, square % 8, cell)
+                pieceList.add(newPiece)
+                self.spriteAt[square] = newPiece
             
         return pieceList
 
@@ -102,31 +159,34 @@ class BoardVisualizer(GameBoard.Board):
         if not GameBoard.Piece.isColour(piece.getType(), self.colourToMove):
             return
 
-        self.curMoveList = self.moveGenerator(piece.getType(), piece.getPos())
+        self.curMoveList = self.moveGenerator(piece.getType(), piece.getSquare())
         if self.curMoveList is None:
             return
 
         moveRectList = []
+        self.curMoveMap = {}
         for move in self.curMoveList:
             assert isinstance(move, GameBoard.Move)
-            rank, file = move.getTarget()
-            cellColour = BLACKMOVECOLOUR if ((file + rank) % 2 == 0) else WHITEMOVECOLOUR
-            moveRectList.append(pygame.draw.rect(self.screen, cellColour, (CELLSIZE * file, CELLSIZE * (7 - rank), CELLSIZE, CELLSIZE)))
+            self.curMoveMap.setdefault(move.getTarget(), []).append(move)
+            rank, file = divmod(move.getTarget(), 8)
+            self.highlightedSquares[move.getTarget()] = BLACKMOVECOLOUR if ((file + rank) % 2 == 0) else WHITEMOVECOLOUR
+            self.markDirty(move.getTarget())
+            moveRectList.append(self.squareRect(move.getTarget()))
 
-        
-        self.pieceList.draw(self.screen)
-        pygame.display.update()
+        self.renderDirty()
 
         return moveRectList
     
     def resetDisplayedMoves(self):
-        self.renderBaseBoard(False)
+        self.markDirty(*self.highlightedSquares)
+        self.highlightedSquares.clear()
 
     def displayPromotions(self, newPos, oldPos):
         rectList = []
-        file = newPos[1]
+        file = newPos % 8
         for x in range(4):
             rectList.append(pygame.draw.rect(self.screen, PROMOTIONBOXCOLOUR, (CELLSIZE * file, CELLSIZE * x, CELLSIZE, CELLSIZE)))
+            self.markDirty((7 - x) * 8 + file) #The menu covers these squares until it's closed
 
         self.promotionGroup = pygame.sprite.Group()
         pieceColour = GameBoard.Piece.WHITE.value if GameBoard.Piece.isColour(self.getBoardValue(oldPos), GameBoard.Piece.WHITE) else GameBoard.Piece.BLACK.value
@@ -135,7 +195,7 @@ class BoardVisualizer(GameBoard.Board):
             self.promotionGroup.add(GamePiece(10-x, file, pieceColour + x))
 
         self.promotionGroup.draw(self.screen)
-        pygame.display.update()
+        pygame.display.update(rectList)
 
         return rectList
 
@@ -160,55 +220,80 @@ class BoardVisualizer(GameBoard.Board):
 
     def resetToMoveSelection(self):
         self.resetDisplayedMoves()
-        self.pieceList.draw(self.screen)
-        pygame.display.update()
+        self.renderDirty()
 
         self.canShowMoves = True
         self.choosingPromotions = False
         self.showingPieceMove = None
         self.promotionRects = None
 
+    def squareAt(self, pos) -> int:
+        """Square under a screen position"""
+        x, y = pos
+        return (7 - y // CELLSIZE) * 8 + x // CELLSIZE
+
     def selectPiece(self, event):
-        for piece in self.pieceList:
-            assert isinstance(piece, GamePiece)
-            if piece.rect.collidepoint(event.pos):
-                self.moveRectList = self.displayMoves(piece)
-                if self.moveRectList:
-                    self.canShowMoves = False
-                    self.showingPieceMove = piece
+        piece = self.spriteAt[self.squareAt(event.pos)]
+        if piece is not None:
+            self.moveRectList = self.displayMoves(piece)
+            if self.moveRectList:
+                self.canShowMoves = False
+                self.showingPieceMove = piece
 
     def selectMove(self, event):
-        for cell in self.moveRectList:
-            assert isinstance(cell, pygame.Rect)
-            assert isinstance(self.showingPieceMove, GamePiece)
-
-            if cell.collidepoint(event.pos):
-                if move := self.getMatchingMove(cell):
-                    if move.type == GameBoard.MoveType.PROMOTION:
-                        self.selectPromotingMove(move)
-                        return
-                    
-                    elif move.type == GameBoard.MoveType.CASTLING:
-                        self.selectCastling(move)
-                    
-                    elif self.getBoardValue(move.getTarget()): #There's a piece on the place we're moving to
-                        self.selectCapture(move)
-
-                    elif move.type == GameBoard.MoveType.ENPASSANT:
-                        self.selectEnPassant(move)
-
-                        
-                    self.confirmMove(move)
-                    self.showingPieceMove.setPos(move.getTarget()[0],move.getTarget()[1])
-                    break
-
-                break #No move selected
+        assert isinstance(self.showingPieceMove, GamePiece)
+        if move := self.getMatchingMove(self.squareRect(self.squareAt(event.pos))):
+            if move.type == GameBoard.MoveType.PROMOTION:
+                self.selectPromotingMove(move)
+                return
+
+            self.playMove(move)
+
+    def playMove(self, move : GameBoard.Move):
+        """Plays a legal move on the board and moves its sprites to match, for clicked moves and for moves played
+        from elsewhere (replays, scripted move streams)"""
+        if move.type == GameBoard.MoveType.CASTLING:
+            self.selectCastling(move)
+
+        elif self.getBoardValue(move.getTarget()): #There's a piece on the place we're moving to
+            self.selectCapture(move)
+
+        elif move.type == GameBoard.MoveType.ENPASSANT:
+            self.selectEnPassant(move)
+
+        self.confirmMove(move)
+        self.moveSprite(move.getOriginal(), move.getTarget())
+        if move.type == GameBoard.MoveType.PROMOTION: #The pawn's sprite is replaced by the promoted piece's
+            self.removeSprite(move.getTarget())
+            self.addSprite(move.getTarget(), self.getBoardValue(move.getTarget()))
+        if self.analysis: #The old position's analysis is cancelled, the new one's starts
+            self.showAnalysisMove(0)
+            pygame.display.set_caption("Chess!")
+            if self.gameState == 0:
+                self.analysis.analyse(self.toFEN())
+            else:
+                self.analysis.stop()
+        self.renderDirty()
+
+    def pollAnalysis(self):
+        """Shows the newest analysis update, if one has arrived. Never waits for the worker"""
+        if self.analysis is None or (result := self.analysis.poll()) is None:
+            return
+        self.showAnalysisMove(result.bestMove)
+        bestMove = GameBoard.Move.encodedToAlgebraic(result.bestMove) if result.bestMove else "-"
+        pygame.display.set_caption(f"Chess! depth {result.depth} {result.scoreText()} bestmove {bestMove}")
+        if not self.choosingPromotions: #The promotion menu covers squares until it's closed, they're redrawn then
+            self.renderDirty()
+
+    def showAnalysisMove(self, move : int):
+        """Outlines the original and target square of a packed move, 0 clears the outline"""
+        self.markDirty(*self.analysisSquares)
+        self.analysisSquares = (GameBoard.Move.originalOf(move), GameBoard.Move.targetOf(move)) if move else ()
+        self.markDirty(*self.analysisSquares)
 
     def getMatchingMove(self, clickedCell : pygame.Rect) -> GameBoard.Move:
-        for move in self.curMoveList:
-            if move.getTarget() == (7 - (clickedCell.y // CELLSIZE), clickedCell.x // CELLSIZE):
-                return move
-        return None #No move clicked
+        moves = self.curMoveMap.get(self.squareAt(clickedCell.topleft))
+        return moves[0] if moves else None #None if no move clicked
 
     def selectPromotingMove(self, move : GameBoard.Move):
         self.promotionRects = self.displayPromotions(move.getTarget(), move.getOriginal())
@@ -217,49 +302,18 @@ class BoardVisualizer(GameBoard.Board):
         self.showingPieceMove = None
 
     def selectCastling(self, move : GameBoard.Move):
-        for y in self.pieceList:
-            assert isinstance(y, GamePiece)
-            match move.getTarget():
-                case (0,6): #White king side castle
-                    if y.getPos() == (0,7):
-                        y.setPos(0,5)
-                        break
-                case (0,2): #White queen side castle
-                    if y.getPos() == (0,0):
-                        y.setPos(0,3)
-                        break
-                case (7,6): #Black king side castle
-                    if y.getPos() == (7,7):
-                        y.setPos(7,5)
-                        break
-                case (7,2): #Black queen side castle
-                    if y.getPos() == (7,0):
-                        y.setPos(7,3)
-                        break
+        rookOriginal, rookTarget = CASTLINGROOKS[move.getTarget()]
+        self.moveSprite(rookOriginal, rookTarget)
 
     def selectCapture(self, move : GameBoard.Move):
-        for y in self.pieceList:
-            assert isinstance(y, GamePiece)
-            if y.getPos() == move.getTarget():
-                y.kill()
-                del y
-                break
+        self.removeSprite(move.getTarget())
 
     def selectEnPassant(self, move : GameBoard.Move):
+        #The captured pawn is behind the target square, seen from the side moving
         if self.colourToMove == GameBoard.Piece.WHITE:
-            for y in self.pieceList:
-                assert isinstance(y, GamePiece)
-                if y.getPos() == (move.getTarget()[0] - 1, move.getTarget()[1]):
-                    y.kill()
-                    del y
-                    break
+            self.removeSprite(move.getTarget() - 8)
         else:
-            for y in self.pieceList:
-                assert isinstance(y, GamePiece)
-                if y.getPos() == (move.getTarget()[0] + 1, move.getTarget()[1]):
-                    y.kill()
-                    del y
-                    break
+            self.removeSprite(move.getTarget() + 8)
 
     def selectPromotion(self, event):
         for promotionCell in self.promotionRects:
@@ -269,21 +323,32 @@ class BoardVisualizer(GameBoard.Board):
             if promotionCell.collidepoint(event.pos):
                 pieceVal = 3 + (promotionCell.y // CELLSIZE)
                 promoteTo = GameBoard.Piece.typeFromtInt(pieceVal)
-                self.confirmMove(GameBoard.Move(move.getOriginal(), move.getTarget(), self.getBoardValue(move.getTarget()), GameBoard.MoveType.PROMOTION, promoteTo))
-                for y in self.pieceList:
-                    assert isinstance(y, GamePiece)
-                    if y.getPos() == move.getOriginal():
-                        y.kill()
-                        del y
-                        break
-
-                self.pieceList.add(GamePiece(move.getTarget()[0], move.getTarget()[1], pieceVal))
+                self.playMove(GameBoard.Move(move.getOriginal(), move.getTarget(), self.getBoardValue(move.getTarget()), GameBoard.MoveType.PROMOTION, promoteTo))
+
+    def addSprite(self, square : int, piece : int):
+        sprite = GamePiece(*divmod(square, 8), piece)
+        self.pieceList.add(sprite)
+        self.spriteAt[square] = sprite
+        self.markDirty(square)
+
+    def removeSprite(self, square : int):
+        if sprite := self.spriteAt[square]:
+            sprite.kill()
+            self.spriteAt[square] = None
+            self.markDirty(square)
+
+    def moveSprite(self, original : int, target : int):
+        sprite = self.spriteAt[original]
+        self.spriteAt[original] = None
+        self.spriteAt[target] = sprite
+        sprite.setPos(*divmod(target, 8))
+        self.markDirty(original, target)
 
     def eventHandler(self):
+        self.pollAnalysis()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                self.quit()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if self.canShowMoves:
@@ -291,7 +356,9 @@ class BoardVisualizer(GameBoard.Board):
                     return
                         
                 elif self.showingPieceMove:
-                    self.selectMove(event)                    
+                    self.selectMove(event)
+                    if self.choosingPromotions: #Promotion menu opened, wait for the piece to be chosen
+                        return
                 
                 elif self.choosingPromotions:
                     self.selectPromotion(event)
@@ -302,13 +369,22 @@ class BoardVisualizer(GameBoard.Board):
     def checkGameClosed(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                self.quit()
+
+    def quit(self):
+        if self.analysis:
+            self.analysis.close()
+        pygame.quit()
+        exit()
 
 
 
 
 if __name__ == "__main__":
     # "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQK2R w KQkq - 0 1"
-    game = BoardVisualizer()
+    parser = argparse.ArgumentParser(description="Play chess on a board in a window")
+    parser.add_argument("FEN", nargs="?", help="Starting position, the standard one if omitted")
+    parser.add_argument("--analysis", action="store_true", help="Show live engine analysis of the position")
+    args = parser.parse_args()
+    game = BoardVisualizer(args.FEN, args.analysis)
     game.run()
\ No newline at end of file
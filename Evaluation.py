@@ -0,0 +1,145 @@
+"""Static evaluation: material plus midgame / endgame piece-square tables, tapered by game phase
+
+Tables are written from white's point of view with rank 8 on the first line, and stored indexed by square (a1 = 0).
+Black pieces use the table of the vertically mirrored square (square ^ 56).
+
+Board keeps the table sums of its pieces up to date as moves are made (Board.midgameScore, endgameScore and phase),
+so evaluate is O(1). With DEBUG set, every evaluation is checked against a full recompute.
+This module only holds tables and doesn't import GameBoard, so GameBoard can build on it.
+"""
+DEBUG = False
+
+#Piece.WHITE.value and Piece.BLACK.value
+WHITE = 8
+BLACK = 16
+
+#Indexed by piece type
+MIDGAMEVALUES = (0, 82, 0, 337, 365, 477, 1025)
+ENDGAMEVALUES = (0, 94, 0, 281, 297, 512, 936)
+
+#Piece values for static exchange evaluation, indexed by piece type. The king is worth more than anything it could win
+EXCHANGEVALUES = (0, 82, 20000, 337, 365, 477, 1025)
+
+#Game phase weight of each piece type, PHASETOTAL is the starting position
+PHASEWEIGHTS = (0, 0, 0, 1, 1, 2, 4)
+PHASETOTAL = 24
+
+def _fromDiagram(diagram : tuple[int]) -> tuple[int]:
+    """Turns a table laid out rank 8 first into one indexed by square"""
+    return tuple(diagram[(7 - (square // 8)) * 8 + square % 8] for square in range(64))
+
+_PAWNMIDGAME = _fromDiagram((
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0))
+
+_PAWNENDGAME = _fromDiagram((
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0))
+
+_KNIGHT = _fromDiagram((
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50))
+
+_BISHOP = _fromDiagram((
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20))
+
+_ROOK = _fromDiagram((
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0))
+
+_QUEEN = _fromDiagram((
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20))
+
+_KINGMIDGAME = _fromDiagram((
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20))
+
+_KINGENDGAME = _fromDiagram((
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50))
+
+_MIDGAMETABLES = ((0,) * 64, _PAWNMIDGAME, _KINGMIDGAME, _KNIGHT, _BISHOP, _ROOK, _QUEEN)
+_ENDGAMETABLES = ((0,) * 64, _PAWNENDGAME, _KINGENDGAME, _KNIGHT, _BISHOP, _ROOK, _QUEEN)
+
+def _buildPieceSquareTable(values, tables) -> tuple[tuple[int]]:
+    """Material and placement combined, indexed [pieceValue][square] and signed so white is positive"""
+    combined = [(0,) * 64] * 23
+    for pieceType in range(1, 7): #Pawn to queen
+        combined[WHITE + pieceType] = tuple(values[pieceType] + tables[pieceType][square] for square in range(64))
+        combined[BLACK + pieceType] = tuple(-(values[pieceType] + tables[pieceType][square ^ 56]) for square in range(64))
+    return tuple(combined)
+
+MIDGAMETABLE = _buildPieceSquareTable(MIDGAMEVALUES, _MIDGAMETABLES)
+ENDGAMETABLE = _buildPieceSquareTable(ENDGAMEVALUES, _ENDGAMETABLES)
+
+def taper(midgame : int, endgame : int, phase : int) -> int:
+    """Blends the midgame and endgame scores, phase is PHASETOTAL at the start and 0 with only kings and pawns left"""
+    phase = min(phase, PHASETOTAL)
+    return (midgame * phase + endgame * (PHASETOTAL - phase)) // PHASETOTAL
+
+def computeScores(squares) -> tuple[int, int, int]:
+    """(midgame, endgame, phase) summed over a flat 64 square board from scratch"""
+    midgame = endgame = phase = 0
+    for square, piece in enumerate(squares):
+        if piece:
+            midgame += MIDGAMETABLE[piece][square]
+            endgame += ENDGAMETABLE[piece][square]
+            phase += PHASEWEIGHTS[piece & 0b000111]
+    return midgame, endgame, phase
+
+def evaluate(board) -> int:
+    """Score of board in centipawns from the side to move's point of view"""
+    if DEBUG:
+        board.verifyIncremental()
+    score = taper(board.midgameScore, board.endgameScore, board.phase)
+    return score if board.colourToMove.value == WHITE else -score
@@ -1,4 +1,8 @@
 from enum import Enum
+from array import array
+import Bitboard
+import Zobrist
+import Evaluation
 
 class MoveType(Enum):
     NORMAL = 0
@@ -64,47 +68,190 @@ class Piece(Enum):
             case _:
                 raise ValueError("Unknown piece")
 
+#Packed move layout: original square (6 bits) | target square (6) | MoveType (2) | promotion piece type (3) | captured piece value (5)
+TARGETSHIFT = 6
+TYPESHIFT = 12
+PROMOTIONSHIFT = 14
+CAPTURESHIFT = 17
+
+#Undo record pushed by makeMove: castling rights (4 bits) | en passant square + 1 (7) | captured piece value (5) | halfmove clock (16)
+UNDOENPASSANTSHIFT = 4
+UNDOCAPTURESHIFT = 11
+UNDOHALFMOVESHIFT = 16
+
+PIECECAPACITY = 10 #Most pieces of one kind a side can have: 2 knights, bishops or rooks and 8 promoted pawns
+
+#Castling rights kept after a move from or onto each square: moving the king or a rook, or capturing a rook, loses them
+CASTLINGMASKS = bytearray([0b1111] * 64)
+CASTLINGMASKS[0], CASTLINGMASKS[4], CASTLINGMASKS[7] = 0b1101, 0b1100, 0b1110 #a1, e1, h1
+CASTLINGMASKS[56], CASTLINGMASKS[60], CASTLINGMASKS[63] = 0b0111, 0b0011, 0b1011 #a8, e8, h8
+
+_MOVETYPES = (MoveType.NORMAL, MoveType.CASTLING, MoveType.ENPASSANT, MoveType.PROMOTION)
+_PROMOTIONPIECES = (None, None, None, Piece.KNIGHT, Piece.BISHOP, Piece.ROOK, Piece.QUEEN)
+
 class Move():
-    def __init__(self, originalCell, destinationCell, targetValue, type : MoveType = MoveType.NORMAL, promotion : Piece = None, initialMove : bool = False):
-        self.__original = originalCell
-        self.__target = destinationCell
-        self.__targetValue = targetValue
-        self.type = type
-        self.initialMove = initialMove
-        if promotion:
-            if self.type == MoveType.PROMOTION:
-                self.promotion = promotion
-            else:
-                raise ValueError("promotion argument should only exist when MoveType is promotion")
-    
+    """Thin view over a packed integer move, used where a readable move object is wanted (e.g. BoardVisualizer).
+    Board generates, makes and unmakes the integers directly"""
+    __slots__ = ("encoded",)
+
+    def __init__(self, originalCell, destinationCell, targetValue, type : MoveType = MoveType.NORMAL, promotion : Piece = None):
+        if promotion and type != MoveType.PROMOTION:
+            raise ValueError("promotion argument should only exist when MoveType is promotion")
+        self.encoded = Move.encode(originalCell, destinationCell, targetValue, type.value, promotion.value if promotion else 0)
+
+    def fromEncoded(encoded : int) -> "Move":
+        move = Move.__new__(Move)
+        move.encoded = encoded
+        return move
+
+    def encode(original : int, target : int, targetValue : int = 0, type : int = 0, promotion : int = 0) -> int:
+        return original | (target << TARGETSHIFT) | (type << TYPESHIFT) | (promotion << PROMOTIONSHIFT) | (targetValue << CAPTURESHIFT)
+
+    def originalOf(encoded : int) -> int:
+        return encoded & 0b111111
+
+    def targetOf(encoded : int) -> int:
+        return (encoded >> TARGETSHIFT) & 0b111111
+
+    def typeOf(encoded : int) -> int:
+        return (encoded >> TYPESHIFT) & 0b11
+
+    def promotionOf(encoded : int) -> int:
+        return (encoded >> PROMOTIONSHIFT) & 0b111
+
+    def capturedOf(encoded : int) -> int:
+        return encoded >> CAPTURESHIFT
+
+    def victimOf(encoded : int) -> int:
+        """Type of the piece the move captures, 0 if none. En passant moves leave the captured piece empty, their victim is a pawn"""
+        if (encoded >> TYPESHIFT) & 0b11 == MoveType.ENPASSANT.value:
+            return Piece.PAWN.value
+        return (encoded >> CAPTURESHIFT) & 0b000111
+
+    def isQuiet(encoded : int) -> bool:
+        """Neither a capture (en passant included) nor a promotion"""
+        return not encoded >> PROMOTIONSHIFT and (encoded >> TYPESHIFT) & 0b11 != MoveType.ENPASSANT.value
+
     def getOriginal(self):
-        return self.__original
+        return self.encoded & 0b111111
     
     def getTarget(self):
-        return self.__target
+        return (self.encoded >> TARGETSHIFT) & 0b111111
     
     def getTargetValue(self):
-        return self.__targetValue
+        return self.encoded >> CAPTURESHIFT
+
+    @property
+    def type(self) -> MoveType:
+        return _MOVETYPES[(self.encoded >> TYPESHIFT) & 0b11]
+
+    @property
+    def promotion(self) -> Piece:
+        return _PROMOTIONPIECES[(self.encoded >> PROMOTIONSHIFT) & 0b111]
+
+    def toAlgebraic(self) -> str:
+        """Long algebraic notation of the move, e.g. e2e4 or e7e8q"""
+        return Move.encodedToAlgebraic(self.encoded)
+
+    def encodedToAlgebraic(encoded : int) -> str:
+        notation = Board.squareToAlgebraic(encoded & 0b111111) + Board.squareToAlgebraic((encoded >> TARGETSHIFT) & 0b111111)
+        if promotion := (encoded >> PROMOTIONSHIFT) & 0b111:
+            notation += " pknbrq"[promotion] #Indexed by piece type
+        return notation
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Move) and self.encoded == other.encoded
+
+    def __hash__(self) -> int:
+        return self.encoded
 
     def __repr__(self) -> str:
         return f"Move:\nOriginal Cell {self.getOriginal()}\nTarget Cell {self.getTarget()}\nCapturing {self.getTargetValue()}"
 
+def _castlingFlag(bit : int) -> property:
+    """Property reading and writing one bit of Board.castling as a bool"""
+    def get(self) -> bool:
+        return bool(self.castling & bit)
+    def set(self, allowed : bool):
+        self.castling = self.castling | bit if allowed else self.castling & ~bit
+    return property(get, set)
+
 class Board():
+    #Fixed attributes keep a Board small, many positions and games can be held in memory at once
+    __slots__ = ("board", "pieceSquares", "pieceCounts", "pieceIndex", "bitboards", "colourOccupancy", "occupied", "castling",
+        "colourToMove", "enPassant", "halfMove", "fullMove", "gameState", "undoStack", "keyHistory", "__zobristKey",
+        "midgameScore", "endgameScore", "phase")
+
     def __init__(self, initialState=None):
+        #Buffers filled in place by setPosition
+        self.board = bytearray(64) #Piece value of every square
+        #Piece lists: the squares of piece value p are pieceSquares[p * PIECECAPACITY : p * PIECECAPACITY + pieceCounts[p]],
+        #pieceIndex[square] is the position of square in its piece's list so a piece is removed in O(1)
+        self.pieceSquares = bytearray(23 * PIECECAPACITY)
+        self.pieceCounts = bytearray(23)
+        self.pieceIndex = bytearray(64)
+        self.bitboards = [0] * 23
+        self.colourOccupancy = [0, 0]
+        self.undoStack = array("I") #One undo record per made move, see UNDOENPASSANTSHIFT
+        self.keyHistory = array("Q") #Zobrist key before each made move, the rest of its undo record
+        self.setPosition(initialState)
+
+    def setPosition(self, initialState=None):
+        """Resets the board to the position of a FEN String (the start position if None), so one Board can be
+        reused for many positions instead of constructing a new one for each. The board's buffers are refilled in place"""
         if initialState == None:
             initialState = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-        self.board, whiteToMove, castling, self.enPassant, self.halfMove, self.fullMove = self.renderFEN(initialState)
-        self.wKingCastle, self.bKingCastle, self.wQueenCastle, self.bQueenCastle = castling
+        board, whiteToMove, castling, enPassant, halfMove, fullMove = self.renderFEN(initialState)
+        counts = bytearray(23)
+        for piece in board:
+            counts[piece] += 1
+        if max(counts[1:]) > PIECECAPACITY:
+            raise ValueError(f"More than {PIECECAPACITY} of one piece: {initialState}")
+        if counts[Piece.WHITE.value + Piece.KING.value] != 1 or counts[Piece.BLACK.value + Piece.KING.value] != 1:
+            raise ValueError(f"Each side needs exactly one king: {initialState}")
+        if halfMove >> (32 - UNDOHALFMOVESHIFT):
+            raise ValueError(f"Halfmove clock too large: {initialState}")
+        bitboards, colourOccupancy = self.buildBitboards(board)
+        if (bitboards[Piece.WHITE.value + Piece.PAWN.value] | bitboards[Piece.BLACK.value + Piece.PAWN.value]) & Bitboard.BACKRANKS:
+            raise ValueError(f"Pawn on the first or last rank: {initialState}")
+        waiting = Piece.BLACK.value if whiteToMove else Piece.WHITE.value
+        waitingKing = Bitboard.bitScan(bitboards[waiting + Piece.KING.value])
+        if self.attackersTo(waitingKing, waiting ^ 0b11000, colourOccupancy[0] | colourOccupancy[1], bitboards):
+            raise ValueError(f"The side not to move is in check: {initialState}")
+
+        #An en passant square makeMove would never have set is dropped: it has to be empty, behind a pawn of the side
+        #not to move that just made a double step from the (empty) square behind it, and a pawn has to capture on it
+        if enPassant != -1:
+            forward = -8 if whiteToMove else 8 #Direction the double step went in
+            if (enPassant >> 3 != (5 if whiteToMove else 2) or board[enPassant] or board[enPassant - forward]
+                    or board[enPassant + forward] != waiting + Piece.PAWN.value
+                    or not Bitboard.PAWNATTACKS[waiting >> 4][enPassant] & bitboards[(waiting ^ 0b11000) + Piece.PAWN.value]):
+                enPassant = -1
+
+        #Castling rights whose king or rook isn't on its starting square are dropped the same way
+        castlingRights = 0
+        for bit, (right, kingSquare, rookSquare, colour) in enumerate(zip((castling[0], castling[2], castling[1], castling[3]),
+                (4, 4, 60, 60), (7, 0, 63, 56), (Piece.WHITE.value, Piece.WHITE.value, Piece.BLACK.value, Piece.BLACK.value))):
+            if right and board[kingSquare] == colour + Piece.KING.value and board[rookSquare] == colour + Piece.ROOK.value:
+                castlingRights |= 1 << bit
+
+        self.board[:] = board
+        self.enPassant, self.halfMove, self.fullMove = enPassant, halfMove, fullMove
+        self.castling = castlingRights
         self.colourToMove = Piece.WHITE if whiteToMove else Piece.BLACK
-        self.whitePieces, self.blackPieces = self.findAllPiecePositions()
+        self.pieceCounts[:] = bytes(23)
+        for square, piece in enumerate(board):
+            if piece:
+                self.__addToPieceList(piece, square)
+        self.bitboards[:] = bitboards
+        self.colourOccupancy[:] = colourOccupancy
+        self.occupied = self.colourOccupancy[0] | self.colourOccupancy[1]
         self.gameState = 0 #0 Running. 1 if draw, 2 if white win, 3 if black win
-
-        self.wKingMoved = False
-        self.bKingMoved = False
-        self.wKRookMoved = False
-        self.wQRookMoved = False
-        self.bKRookMoved = False
-        self.bQRookMoved = False
+        del self.undoStack[:]
+        del self.keyHistory[:]
+        self.__zobristKey = self.computeZobristKey()
+        #Material and piece-square table sums (white positive) and game phase, kept up to date like the key
+        self.midgameScore, self.endgameScore, self.phase = Evaluation.computeScores(self.board)
     
     def renderFEN(self, FEN : str):
         """Takes a FEN String and returns the data it represents
@@ -114,9 +261,11 @@ class Board():
 
         Returns:
         (board, whiteToMove, castleAvailability, enPassant, halfMove, fullMove)
+        board is a flat list of 64 piece values indexed by square (rank * 8 + file, a1 = 0), enPassant a square or -1 if none,
+        halfMove and fullMove are ints
 
         """
-        board = [[0 for x in range(8)] for y in range(8)]
+        board = [0] * 64
         pieceFromChar = {"p" : Piece.PAWN, "n" : Piece.KNIGHT, "b" : Piece.BISHOP, "r" : Piece.ROOK, "q" : Piece.QUEEN, "k" : Piece.KING}
 
         positioning, turn, castling, enPassant, halfMove, fullMove = FEN.split(" ")
@@ -127,6 +276,8 @@ class Board():
             if char.isnumeric():
                 curFile += int(char)
             elif char == "/": # / Means new rank in FEN
+                if curFile != 8:
+                    raise ValueError(f"Invalid FEN String - Invalid piece placement: {FEN}")
                 curFile = 0
                 curRank -= 1
             else:
@@ -136,10 +287,12 @@ class Board():
                     newPiece += pieceFromChar[char.lower()].value
                 except KeyError:
                     raise ValueError(f"Invalid FEN String - Invalid piece placement: {FEN}")
-                board[8 - curRank][curFile] = newPiece
+                if curFile > 7 or curRank < 1: #Piece placed off the board
+                    raise ValueError(f"Invalid FEN String - Invalid piece placement: {FEN}")
+                board[(curRank - 1) * 8 + curFile] = newPiece
                 curFile += 1
 
-        if curRank != 1 and curFile != 8: #If by the end of the positioning, check if curRank and curFile indicate end of board
+        if curRank != 1 or curFile != 8: #If by the end of the positioning, check if curRank and curFile indicate end of board
             raise ValueError(f"Invalid FEN String - Invalid piece placement: {FEN}")
         
         if turn == "w":
@@ -155,281 +308,540 @@ class Board():
             castleAvailability = [False, False, False, False]
             for char in castling:
                 match char:
-                    case "k": #Black king-side castling available
-                        castleAvailability[2] = True
                     case "K": #White king-side castling available
                         castleAvailability[0] = True
-                    case "q": #Black queen-side castling available
+                    case "k": #Black king-side castling available
                         castleAvailability[1] = True
                     case "Q": #White queen-side castling available
+                        castleAvailability[2] = True
+                    case "q": #Black queen-side castling available
                         castleAvailability[3] = True
                     case _:
                         raise ValueError (f"Invalid FEN String - Castling availability invalid: {FEN}")
         
         if enPassant == "-":
-            enPassant = []
+            enPassant = -1
         else:
             try:
-                enPassant = [Board.algebraicNotationToRankFile(enPassant)]
+                enPassant = Board.algebraicNotationToSquare(enPassant)
             except ValueError:
                 raise ValueError (f"Invalid FEN String - En Passant invalid: {FEN}")
 
-        return (board, whiteToMove, castleAvailability, enPassant, halfMove, fullMove)
-    
+        if not (halfMove.isdigit() and fullMove.isdigit()):
+            raise ValueError (f"Invalid FEN String - Move counters invalid: {FEN}")
+
+        return (board, whiteToMove, castleAvailability, enPassant, int(halfMove), int(fullMove))
+
+    def toFEN(self) -> str:
+        """FEN String of the current position, the inverse of renderFEN"""
+        charFromPiece = " pknbrq"
+        ranks = []
+        for rank in range(7, -1, -1):
+            text = ""
+            empty = 0
+            for piece in self.board[rank * 8 : rank * 8 + 8]:
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                char = charFromPiece[piece & 0b000111]
+                text += char.upper() if piece & Piece.WHITE.value else char
+            ranks.append(text + (str(empty) if empty else ""))
+
+        castling = "".join(char for bit, char in enumerate("KQkq") if self.castling >> bit & 1)
+        enPassant = Board.squareToAlgebraic(self.enPassant) if self.enPassant != -1 else "-"
+        turn = "w" if self.colourToMove == Piece.WHITE else "b"
+        return f"{'/'.join(ranks)} {turn} {castling or '-'} {enPassant} {self.halfMove} {self.fullMove}"
+
     def findAllPiecePositions(self) -> tuple[dict]:
         blackPieces = {Piece.PAWN: set(), Piece.KNIGHT: set(), Piece.BISHOP: set(), Piece.ROOK: set(), Piece.QUEEN: set(), Piece.KING : set()}
         whitePieces = {Piece.PAWN: set(), Piece.KNIGHT: set(), Piece.BISHOP: set(), Piece.ROOK: set(), Piece.QUEEN: set(), Piece.KING : set()}
-        for rank, row in enumerate(self.board):
-            for file, cell in enumerate(row):
-                match Piece.pieceColour(cell):
-                    case Piece.WHITE.value:
-                        whitePieces[Piece.typeFromtInt(cell)].add((7-rank, file))
-                    case Piece.BLACK.value:
-                        blackPieces[Piece.typeFromtInt(cell)].add((7-rank, file))
+        for square, cell in enumerate(self.board):
+            match Piece.pieceColour(cell):
+                case Piece.WHITE.value:
+                    whitePieces[Piece.typeFromtInt(cell)].add(square)
+                case Piece.BLACK.value:
+                    blackPieces[Piece.typeFromtInt(cell)].add(square)
 
         return (whitePieces, blackPieces)
         
-    def moveGenerator(self, piece : int, position : tuple[int, int]):
+    def buildBitboards(self, squares = None) -> tuple[list[int], list[int]]:
+        """Builds the piece bitboards (indexed by piece value) and the occupancy of each colour (indexed by colour >> 4)
+        of squares, the board's own squares if not given"""
+        bitboards = [0] * 23
+        colourOccupancy = [0, 0]
+        for square, cell in enumerate(self.board if squares is None else squares):
+            if cell:
+                bitboards[cell] |= 1 << square
+                colourOccupancy[cell >> 4] |= 1 << square
+
+        return (bitboards, colourOccupancy)
+
+    def moveGenerator(self, piece : int, square : int, legalityMasks : tuple = None):
         assert isinstance(piece, int)
-        assert isinstance(position, tuple)
+        assert isinstance(square, int)
         if not Piece.isColour(piece, self.colourToMove): #Checks if piece is belongs to the current player's turn
             return None
 
-        if Piece.isSliding(piece):
-            moveList = self.__moveGeneratorHelper(piece, position, 8)
-            return moveList
-        
+        if legalityMasks is None:
+            legalityMasks = self.legalityMasks()
+        moveList = []
+        self.generatePieceMoves(piece, square, legalityMasks, moveList)
+        return {Move.fromEncoded(move) for move in moveList}
+
+    def generateLegalMoves(self, moveList = None, captures : bool = True, quiets : bool = True, legalityMasks : tuple = None):
+        """Appends every legal move of the side to move to moveList as packed integers (see Move.encode)
+
+        Parameters:
+        moveList: a list or array("I") to fill, a new array("I") if not given
+        captures, quiets: which moves to generate. Captures include en passant and capturing promotions,
+        quiets include castling and promotions by pushing
+        legalityMasks: the result of legalityMasks() if already computed for this position
+
+        Returns:
+        moveList
+        """
+        if moveList is None:
+            moveList = array("I")
+        if legalityMasks is None:
+            legalityMasks = self.legalityMasks()
+        colour = self.colourToMove.value
+        targetMask = (self.colourOccupancy[(colour >> 4) ^ 1] if captures else 0) | (~self.occupied & Bitboard.FULL if quiets else 0)
+        for pieceType in range(Piece.PAWN.value, Piece.QUEEN.value + 1):
+            pieces = self.bitboards[colour + pieceType]
+            while pieces:
+                pieceBit = pieces & -pieces
+                pieces ^= pieceBit
+                self.generatePieceMoves(colour + pieceType, pieceBit.bit_length() - 1, legalityMasks, moveList, targetMask)
+        return moveList
+
+    def generateStagedMoves(self, hashMove : int = 0, killers = (), quietKey = None, quiets : bool = True):
+        """Lazily yields the legal moves of the side to move as packed integers, best candidates first:
+        the hash move, captures by most valuable victim / least valuable attacker, promotions, killers, then quiet moves.
+        A stage is only generated once the previous one is used up, so a cutoff early on skips generating the rest
+
+        Parameters:
+        hashMove: a move to try first (e.g. from the transposition table), skipped if it isn't legal here
+        killers: quiet moves to try before the other quiet moves, each skipped if it isn't legal here
+        quietKey: sort key for the remaining quiet moves (e.g. MoveOrdering.historyKey), generation order if None
+        quiets: if False only captures and promotions are yielded (e.g. for a quiescence search)
+        """
+        legalityMasks = self.legalityMasks()
+        board = self.board
+        colour = self.colourToMove.value
+        empty = ~self.occupied & Bitboard.FULL
+
+        def isLegal(move : int, targetMask : int = Bitboard.FULL) -> bool:
+            """Whether move is legal here, found by generating only the moves of the piece on its original square"""
+            piece = board[move & 0b111111]
+            if not piece or not Piece.isColour(piece, self.colourToMove):
+                return False
+            pieceMoves = []
+            self.generatePieceMoves(piece, move & 0b111111, legalityMasks, pieceMoves, targetMask)
+            return move in pieceMoves
+
+        if hashMove:
+            if isLegal(hashMove):
+                yield hashMove
+            else:
+                hashMove = 0
+
+        values = Evaluation.MIDGAMEVALUES
+        captures = self.generateLegalMoves([], True, False, legalityMasks)
+        captures.sort(key=lambda move: values[board[move & 0b111111] & 0b000111] - 10 * values[Move.victimOf(move)])
+        for move in captures:
+            if move != hashMove:
+                yield move
+
+        #Promotions: only the pushes of pawns about to promote are generated
+        pawn = colour + Piece.PAWN.value
+        pawns = self.bitboards[pawn] & (0x00FF_0000_0000_0000 if colour == Piece.WHITE.value else 0xFF00)
+        promotions = []
+        while pawns:
+            pawnBit = pawns & -pawns
+            pawns ^= pawnBit
+            self.generatePieceMoves(pawn, pawnBit.bit_length() - 1, legalityMasks, promotions, empty)
+        for move in promotions:
+            if move != hashMove:
+                yield move
+        if not quiets:
+            return
+
+        tried = [hashMove]
+        for move in killers:
+            if move and move not in tried and not move >> PROMOTIONSHIFT and isLegal(move, empty):
+                tried.append(move)
+                yield move
+
+        quietMoves = self.generateLegalMoves([], False, True, legalityMasks)
+        if quietKey is not None:
+            quietMoves.sort(key=quietKey)
+        for move in quietMoves:
+            if not move >> PROMOTIONSHIFT and move not in tried:
+                yield move
+
+    def legalityMasks(self) -> tuple[int, int, dict]:
+        """Computes the legality information for the side to move once per position
+
+        Returns:
+        (checkers, checkMask, pinRays)
+        checkers is a bitboard of the enemy pieces giving check, checkMask the squares a non king move has to land on
+        (every square when not in check, none in double check) and pinRays maps each pinned square to the ray it may move along
+        """
+        ally = self.colourToMove.value
+        enemy = Piece.flipColour(self.colourToMove).value
+        king = self.bitboards[ally + Piece.KING.value]
+        if not king:
+            return (0, Bitboard.FULL, {})
+        kingSquare = Bitboard.bitScan(king)
+
+        checkers = self.attackersTo(kingSquare, enemy, self.occupied)
+        if not checkers:
+            checkMask = Bitboard.FULL
+        elif checkers & (checkers - 1): #Double check, only the king can move
+            checkMask = 0
+        else:
+            checkMask = checkers | Bitboard.BETWEEN[kingSquare][Bitboard.bitScan(checkers)]
+
+        pinRays = {}
+        queens = self.bitboards[enemy + Piece.QUEEN.value]
+        snipers = (Bitboard.rookAttacks(kingSquare, 0) & (self.bitboards[enemy + Piece.ROOK.value] | queens)) | \
+                  (Bitboard.bishopAttacks(kingSquare, 0) & (self.bitboards[enemy + Piece.BISHOP.value] | queens))
+        allyPieces = self.colourOccupancy[ally >> 4]
+        while snipers:
+            sniperBit = snipers & -snipers
+            snipers ^= sniperBit
+            sniper = sniperBit.bit_length() - 1
+            blockers = Bitboard.BETWEEN[kingSquare][sniper] & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & allyPieces: #Exactly one blocker and it's ours
+                pinRays[Bitboard.bitScan(blockers)] = Bitboard.BETWEEN[kingSquare][sniper] | sniperBit
+
+        return (checkers, checkMask, pinRays)
+
+    def generatePieceMoves(self, piece : int, square : int, legalityMasks : tuple, moveList, targetMask : int = Bitboard.FULL):
+        """Appends the legal moves of the piece on square whose target (for en passant the captured pawn) is in targetMask.
+        Every move generation of the board goes through here, a subclass can override it to observe them (see Instrumentation)"""
+        checkers, checkMask, pinRays = legalityMasks
+
+        #Every non king move has to land on the check mask, and a pinned piece has to stay on its pin ray
+        allowed = checkMask & pinRays.get(square, Bitboard.FULL) & ~self.colourOccupancy[piece >> 4]
+
         match Piece.pieceType(piece):
             case Piece.PAWN.value: #Pawn
-                moveList = self.__moveGeneratorPawn(piece, position)
+                self.__moveGeneratorPawn(piece, square, allowed, moveList, targetMask)
             case Piece.KNIGHT.value: #Knight
-                moveList = self.__moveGeneratorHelper(piece, position, repeat=1)
+                self.__moveGeneratorHelper(square, Bitboard.KNIGHTATTACKS[square] & allowed & targetMask, moveList)
+            case Piece.BISHOP.value:
+                self.__moveGeneratorHelper(square, Bitboard.bishopAttacks(square, self.occupied) & allowed & targetMask, moveList)
+            case Piece.ROOK.value:
+                self.__moveGeneratorHelper(square, Bitboard.rookAttacks(square, self.occupied) & allowed & targetMask, moveList)
+            case Piece.QUEEN.value:
+                self.__moveGeneratorHelper(square, Bitboard.queenAttacks(square, self.occupied) & allowed & targetMask, moveList)
             case Piece.KING.value: #King
-                moveList = self.__moveGeneratorHelper(piece, position, repeat=1) #repeat=1 so that only a movement distance of 1 is generated
-
-                #Castling
-                if not self.curKingThreat(): #Can only castle if king is not in check
-                    if Piece.isColour(piece, Piece.WHITE):
-                        if self.wKingCastle:
-                            for move in moveList:
-                                if (0,5) == move.getTarget() and self.getBoardValue((0,6)) == 0 and not self.threatChecker((0,6), Piece.WHITE): #Space directly next to king is safe+empty && castle target is empty && castle target is safe
-                                    moveList.add(Move(position, (0,6), 0, MoveType.CASTLING, initialMove=True))
-                                    break
-                        if self.wQueenCastle:
-                            for move in moveList:
-                                if (0,3) == move.getTarget() and self.getBoardValue((0,2)) == 0 and not self.threatChecker((0,2), Piece.WHITE): #Space directly next to king is safe+empty && castle target is empty && castle target is safe
-                                    moveList.add(Move(position, (0,2), 0, MoveType.CASTLING, initialMove=True))
-                                    break
-                    else:
-                        if self.bKingCastle:
-                            for move in moveList:
-                                if (7,5) == move.getTarget() and self.getBoardValue((7,6)) == 0 and not self.threatChecker((7,6), Piece.BLACK): #Space directly next to king is safe+empty && castle target is empty && castle target is safe
-                                    moveList.add(Move(position, (7,6), 0, MoveType.CASTLING, initialMove=True))
-                                    break
-                        if self.bQueenCastle:
-                            for move in moveList:
-                                if (7,5) == move.getTarget() and self.getBoardValue((7,6)) == 0 and not self.threatChecker((7,6), Piece.BLACK): #Space directly next to king is safe+empty && castle target is empty && castle target is safe
-                                    moveList.add(Move(position, (7,2), 0, MoveType.CASTLING, initialMove=True))
-                                    break
+                self.__moveGeneratorKing(piece, square, checkers, moveList, targetMask)
             case _:
                 raise ValueError("Unknown piece")
 
-        return moveList
-
-    def __moveGeneratorHelper(self, piece, position, repeat=8):
-        if Piece.isType(piece, Piece.KNIGHT):
-            offsets = ((-2,-1), (-2,1), (-1,-2), (-1,2),
-                       (1,-2), (1, 2), (2, 1), (2, -1)) #Offsets for knight movement
-        else:
-            offsets = ((-1,-1),(-1,1),(1, -1),(1, 1), #Offsets for diagonal moving pieces
-                        (-1,0), (0, -1), (0, 1), (1, 0)) #Offsets for orthogonal moving pieces
-        
-        startIndex = 4 if Piece.isType(piece, Piece.ROOK) else 0 #If it's a rook, we only use the offsets for orthogonal pieces (offsets[4:])
-        stopIndex = 4 if Piece.isType(piece, Piece.BISHOP) else 8 #If it's a bishop we only use the offsets for diagonal pieces (offests[:4])
-
-        moveList = set()
-
-        initialMove = False
-        match Piece.typeFromtInt(piece):
-            case Piece.KING:
-                if Piece.isColour(piece, Piece.WHITE):
-                    initialMove = not self.wKingMoved
-                else:
-                    initialMove = not self.bKingMoved
-            case Piece.ROOK:
-                if Piece.isColour(piece, Piece.WHITE):
-                    if position[1] == 7: #King side rook
-                        initialMove = not self.wKRookMoved
-                    elif position[1] == 0: #Queen side rook
-                        initialMove = not self.wQRookMoved
-                else:
-                    if position[1] == 7: #King side rook
-                        initialMove = not self.bKRookMoved
-                    elif position[1] == 0: #Queen side rook
-                        initialMove = not self.bQRookMoved
-        for x in range(startIndex, stopIndex):
-            multiplier = 1
-
-            while multiplier <= repeat:
-                change = offsets[x]
-                newPos = Board.posChange(position, change, multiplier)
-
-                if Board.isOutOfBounds(newPos) or Piece.isColour(self.getBoardValue(newPos), self.colourToMove):
-                    break
-
-                if not self.curKingThreat(newMove := Move(position, newPos, self.getBoardValue(newPos), initialMove=initialMove)):
-                    moveList.add(newMove)
-
-                if Piece.isColour(self.getBoardValue(newPos), Piece.flipColour(self.colourToMove)):
-                    break
-
-                multiplier += 1
-
-        return moveList
+    def __moveGeneratorHelper(self, square, targets : int, moveList):
+        """Appends a move from square to every square of the legal targets bitboard"""
+        board = self.board
+        while targets:
+            targetBit = targets & -targets
+            targets ^= targetBit
+            target = targetBit.bit_length() - 1
+            moveList.append(square | (target << TARGETSHIFT) | (board[target] << CAPTURESHIFT))
+
+    def __moveGeneratorKing(self, piece, square, checkers : int, moveList, targetMask : int):
+        enemy = Piece.flipColour(self.colourToMove)
+        #The king can't hide behind itself from a slider, so test the targets without it on the board
+        occupancy = self.occupied ^ (1 << square)
+
+        targets = Bitboard.KINGATTACKS[square] & ~self.colourOccupancy[piece >> 4] & targetMask
+        while targets:
+            targetBit = targets & -targets
+            targets ^= targetBit
+            target = targetBit.bit_length() - 1
+            if not self.isSquareAttacked(target, enemy, occupancy):
+                moveList.append(square | (target << TARGETSHIFT) | (self.board[target] << CAPTURESHIFT))
+
+        #Castling
+        if not checkers: #Can only castle if king is not in check
+            base = 0 if Piece.isColour(piece, Piece.WHITE) else 56 #a1 or a8
+            rights = self.castling if base == 0 else self.castling >> 2
+            kingSide, queenSide = rights & 1, rights & 2
+            rook = self.bitboards[Piece.ROOK.value + Piece.pieceColour(piece)]
+            castling = MoveType.CASTLING.value << TYPESHIFT
+            if kingSide and targetMask & (1 << (base + 6)) and rook & (1 << (base + 7)) and not self.occupied & (0b0110_0000 << base):
+                if not self.isSquareAttacked(base + 5, enemy) and not self.isSquareAttacked(base + 6, enemy): #Squares the king passes through and lands on are safe
+                    moveList.append(square | ((base + 6) << TARGETSHIFT) | castling)
+            if queenSide and targetMask & (1 << (base + 2)) and rook & (1 << base) and not self.occupied & (0b0000_1110 << base):
+                if not self.isSquareAttacked(base + 3, enemy) and not self.isSquareAttacked(base + 2, enemy):
+                    moveList.append(square | ((base + 2) << TARGETSHIFT) | castling)
     
-    def __moveGeneratorPawn(self, piece, position):
-        offset  = ((1,0), (1,-1), (1,1), # White movement + capture
-                   (-1,0), (-1,-1), (-1,1)) # Black movement + capture
-        
-        startIndex = 0 if Piece.isColour(piece, Piece.WHITE) else 3
-
-        moveList = set()
-        
-        change = offset[startIndex]
-        newPos = Board.posChange(position, change)
-        if self.getBoardValue(newPos) == 0: #Empty Cell
-            if not self.curKingThreat(Move(position, newPos, 0)):
-                if (newPos[0] == 7 and Piece.isColour(piece, Piece.WHITE)) or (newPos[0] == 0 and Piece.isColour(piece, Piece.BLACK)):
-                    moveList.add(Move(position, newPos, 0, MoveType.PROMOTION, Piece.BISHOP))
-                    moveList.add(Move(position, newPos, 0, MoveType.PROMOTION, Piece.KNIGHT))
-                    moveList.add(Move(position, newPos, 0, MoveType.PROMOTION, Piece.ROOK))
-                    moveList.add(Move(position, newPos, 0, MoveType.PROMOTION, Piece.QUEEN))
-                else:
-                    moveList.add(Move(position, newPos, 0))
-
+    def pawnTargets(self, piece, square) -> int:
+        """Bitboard of the pushes and captures (not en passant) of the pawn on square, before legality masks"""
+        isWhite = Piece.isColour(piece, Piece.WHITE)
+
+        #Pushes
+        targets = 0
+        pushBit = 1 << (square + 8) if isWhite else 1 << (square - 8)
+        if not self.occupied & pushBit:
+            targets |= pushBit
             #If double move is possible
-            if (position[0] == 1 and Piece.isColour(piece, Piece.WHITE)) or (position[0] == 6 and Piece.isColour(piece, Piece.BLACK)):
-                newPos2 = Board.posChange(newPos, change)
-                if self.getBoardValue(newPos2) == 0 and not self.curKingThreat(Move(position, newPos2, 0)): #Empty Cell 2 spaces
-                    moveList.add(Move(position, newPos2, 0))
-        
-        #Captures
-        for change in offset[startIndex+1], offset[startIndex+2]:
-            newPos = Board.posChange(position, change)
-            
-            #If diagonal movement lands on a piece of different colour
-            if Board.isOutOfBounds(newPos):
-                continue
-
-            if Piece.isColour(self.getBoardValue(newPos), Piece.flipColour(self.colourToMove)):
-                if not self.curKingThreat(Move(position, newPos, self.getBoardValue(newPos))):
-                    if (newPos[0] == 7 and Piece.isColour(piece, Piece.WHITE)) or (newPos[0] == 0 and Piece.isColour(piece, Piece.BLACK)):
-                        moveList.add(Move(position, newPos, self.getBoardValue(newPos), MoveType.PROMOTION, Piece.BISHOP))
-                        moveList.add(Move(position, newPos, self.getBoardValue(newPos), MoveType.PROMOTION, Piece.KNIGHT))
-                        moveList.add(Move(position, newPos, self.getBoardValue(newPos), MoveType.PROMOTION, Piece.ROOK))
-                        moveList.add(Move(position, newPos, self.getBoardValue(newPos), MoveType.PROMOTION, Piece.QUEEN))
-                    else:
-                        moveList.add(Move(position, newPos, self.getBoardValue(newPos)))
-                
-            #En passant
-            if self.getBoardValue(newPos) == 0 and newPos == self.enPassant[-1] and not self.curKingThreat(Move(position, newPos, self.getBoardValue(newPos), MoveType.ENPASSANT)):
-                moveList.add(Move(position, newPos, self.getBoardValue(newPos), MoveType.ENPASSANT))
-
+            if (8 <= square < 16 and isWhite) or (48 <= square < 56 and not isWhite):
+                doubleBit = pushBit << 8 if isWhite else pushBit >> 8
+                if not self.occupied & doubleBit:
+                    targets |= doubleBit
 
-        return moveList
+        #Captures
+        return targets | (Bitboard.PAWNATTACKS[piece >> 4][square] & self.colourOccupancy[(piece >> 4) ^ 1])
+
+    def __moveGeneratorPawn(self, piece, square, allowed : int, moveList, targetMask : int):
+        targets = self.pawnTargets(piece, square) & allowed & targetMask
+
+        while targets:
+            targetBit = targets & -targets
+            targets ^= targetBit
+            target = targetBit.bit_length() - 1
+            move = square | (target << TARGETSHIFT) | (self.board[target] << CAPTURESHIFT)
+
+            if target >= 56 or target < 8: #Pawns only reach the back ranks by promoting
+                move |= MoveType.PROMOTION.value << TYPESHIFT
+                moveList.append(move | (Piece.QUEEN.value << PROMOTIONSHIFT))
+                moveList.append(move | (Piece.ROOK.value << PROMOTIONSHIFT))
+                moveList.append(move | (Piece.BISHOP.value << PROMOTIONSHIFT))
+                moveList.append(move | (Piece.KNIGHT.value << PROMOTIONSHIFT))
+            else:
+                moveList.append(move)
+
+        #En passant removes two pieces from the king's lines, so it is still verified by making the move
+        if (target := self.enPassant) != -1:
+            if Bitboard.PAWNATTACKS[piece >> 4][square] & (1 << target) and targetMask & (1 << ((square & 56) + (target & 7))):
+                move = square | (target << TARGETSHIFT) | (MoveType.ENPASSANT.value << TYPESHIFT)
+                if not self.curKingThreat(move):
+                    moveList.append(move)
+
+    def hasLegalMove(self) -> bool:
+        """Whether the side to move has any legal move, stopping at the first one found.
+        Much cheaper than generating every move when only checkmate / stalemate detection is needed"""
+        colour = self.colourToMove.value
+        ownPieces = self.colourOccupancy[colour >> 4]
+
+        #The king first, its moves need no pin or check masks. Castling can be skipped: if it is legal, so is the step beside the king
+        king = self.bitboards[colour + Piece.KING.value]
+        if king:
+            square = king.bit_length() - 1
+            enemy = Piece.flipColour(self.colourToMove)
+            occupancy = self.occupied ^ king
+            targets = Bitboard.KINGATTACKS[square] & ~ownPieces
+            while targets:
+                targetBit = targets & -targets
+                targets ^= targetBit
+                if not self.isSquareAttacked(targetBit.bit_length() - 1, enemy, occupancy):
+                    return True
+
+        checkers, checkMask, pinRays = self.legalityMasks()
+        if not checkMask: #Double check and the king can't move
+            return False
+
+        #Then the pieces most likely to have a free square
+        for pieceType in (Piece.QUEEN.value, Piece.KNIGHT.value, Piece.ROOK.value, Piece.BISHOP.value, Piece.PAWN.value):
+            piece = colour + pieceType
+            pieces = self.bitboards[piece]
+            while pieces:
+                pieceBit = pieces & -pieces
+                pieces ^= pieceBit
+                square = pieceBit.bit_length() - 1
+                allowed = checkMask & pinRays.get(square, Bitboard.FULL) & ~ownPieces
+                match pieceType:
+                    case Piece.PAWN.value:
+                        targets = self.pawnTargets(piece, square)
+                    case Piece.KNIGHT.value:
+                        targets = Bitboard.KNIGHTATTACKS[square]
+                    case Piece.BISHOP.value:
+                        targets = Bitboard.bishopAttacks(square, self.occupied)
+                    case Piece.ROOK.value:
+                        targets = Bitboard.rookAttacks(square, self.occupied)
+                    case _:
+                        targets = Bitboard.queenAttacks(square, self.occupied)
+                if targets & allowed:
+                    return True
+
+        #En passant, verified by making the move as in the generator
+        if (target := self.enPassant) != -1:
+            pawns = self.bitboards[colour + Piece.PAWN.value] & Bitboard.PAWNATTACKS[(colour >> 4) ^ 1][target]
+            while pawns:
+                pawnBit = pawns & -pawns
+                pawns ^= pawnBit
+                if not self.curKingThreat((pawnBit.bit_length() - 1) | (target << TARGETSHIFT) | (MoveType.ENPASSANT.value << TYPESHIFT)):
+                    return True
+        return False
 
     def generateAllMoves(self, colour : Piece) -> dict:
-        moveList = {}
-        if colour == Piece.WHITE:
-            for pieces in self.whitePieces.values():
-                for piecePos in pieces:
-                    moveList[piecePos] = self.moveGenerator(self.getBoardValue(piecePos), piecePos)
-        elif colour == Piece.BLACK:
-            for pieces in self.blackPieces.values():
-                for piecePos in pieces:
-                    moveList[piecePos] = self.moveGenerator(self.getBoardValue(piecePos), piecePos)
-        else:
+        """Legal moves of colour as Move objects grouped by the square they move from"""
+        if colour != Piece.WHITE and colour != Piece.BLACK:
             raise ValueError("Unknown colour")
+        moveList = {}
+        if colour != self.colourToMove:
+            return moveList
+
+        for move in self.generateLegalMoves():
+            moveList.setdefault(move & 0b111111, set()).add(Move.fromEncoded(move))
         return moveList
     
     def curKingThreat(self, move = None) -> bool:
         #Looping just in case you play a weird mode with multiple kings
-        for x in self.getCurrentColourPieces()[Piece.KING]:
+        for x in self.piecePositions(self.colourToMove.value + Piece.KING.value):
             if self.threatChecker(x, self.colourToMove, move):
                 return True
         return False
 
-    def threatChecker(self, pos : tuple[int, int], allyColour : Enum, move : Move = None) -> bool:
+    def inCheck(self) -> bool:
+        king = self.bitboards[self.colourToMove.value + Piece.KING.value]
+        return bool(king) and self.isSquareAttacked(Bitboard.bitScan(king), Piece.flipColour(self.colourToMove))
+
+    def threatChecker(self, square : int, allyColour : Enum, move : int = None) -> bool:
         '''
-        Checks if there is a piece threatening the cell pos
-        if move is provided, evaluate the threat after move has been made
+        Checks if there is a piece threatening the cell square
+        if move (packed or a Move) is provided, evaluate the threat after move has been made
         returns True if there is a threat, false if not
         '''
-        offsets = ((-1,-1),(-1,1),(1, -1),(1, 1), #Offsets for diagonal moving pieces
-                    (-1,0), (0, -1), (0, 1), (1, 0)) #Offsets for orthogonal moving pieces
-        knightOffset = ((-2,-1), (-2,1), (-1,-2), (-1,2),
-                       (1,-2), (1, 2), (2, 1), (2, -1))
-        pawnOffset = ((1,-1),(1,1), #White pawn captures
-                     (-1,-1), (-1,1)) #Black pawn capturess
-
+        if isinstance(move, Move):
+            move = move.encoded
         if move:
             #If we're tracking the threat to the king
-            if Piece.isType(self.getBoardValue(move.getOriginal()), Piece.KING):
-                pos = move.getTarget()
-            self.__makeMove(move)
-
-        #Knight threats
-        for x in knightOffset:
-            newPos = Board.posChange(pos, x)
-            if not(Board.isOutOfBounds(newPos)) and (self.getBoardValue(newPos) == (Piece.flipColour(allyColour).value + Piece.KNIGHT.value)):
-                if move:
-                    self.unmakeMove(move)
-                return True
-        
-        #Sliding Pieces and king threat
-        for x in range(0, 7):
-            multiplier = 1
-
-            while multiplier <= 7: #Guaranteed out of bounds if multiplier is > 8
-                change = offsets[x]
-                newPos = Board.posChange(pos, change, multiplier)
-
-                if Board.isOutOfBounds(newPos) or Piece.isColour(newPosPiece := self.getBoardValue(newPos), allyColour):
-                    break
-
-                if Piece.isColour(newPosPiece, Piece.flipColour(allyColour)):
-                    if Piece.isType(newPosPiece, Piece.QUEEN) or Piece.isType(newPosPiece, (Piece.BISHOP if x <= 3 else Piece.ROOK)) or (Piece.isType(newPosPiece, Piece.KING) and multiplier == 1):
-                        if move:
-                            self.unmakeMove(move)
-                        return True
-                    else:
-                        break
-
-                multiplier += 1
-
-        #Pawns
-        startIndex = 0 if allyColour == Piece.BLACK else 2
-        for x in range(startIndex, startIndex+2):
-            newPos = Board.posChange(pos, pawnOffset[x])
-
-            if Board.isOutOfBounds(newPos) or Piece.isColour(newPosPiece := self.getBoardValue(newPos), allyColour):
-                continue
-            
-            if newPosPiece == (allyColour.value + Piece.PAWN.value): #Check if it is a opposing pawn
-                if move:
-                    self.unmakeMove(move)
-                return True
+            if Piece.isType(self.board[move & 0b111111], Piece.KING):
+                square = (move >> TARGETSHIFT) & 0b111111
+            self.makeMove(move)
+
+        threatened = self.isSquareAttacked(square, Piece.flipColour(allyColour))
 
         if move:
             self.unmakeMove(move)
+        return threatened
+
+    def isSquareAttacked(self, square : int, attackerColour : Enum, occupancy : int = None) -> bool:
+        """Set-wise attack test: looks up the attack sets from square and intersects them with the attacker's bitboards"""
+        attacker = attackerColour.value
+        bitboards = self.bitboards
+        if occupancy is None:
+            occupancy = self.occupied
+
+        if Bitboard.KNIGHTATTACKS[square] & bitboards[attacker + Piece.KNIGHT.value]:
+            return True
+        if Bitboard.KINGATTACKS[square] & bitboards[attacker + Piece.KING.value]:
+            return True
+        #A pawn attacks square if it stands where a pawn of the other colour on square would capture
+        if Bitboard.PAWNATTACKS[(attacker >> 4) ^ 1][square] & bitboards[attacker + Piece.PAWN.value]:
+            return True
+
+        queens = bitboards[attacker + Piece.QUEEN.value]
+        if Bitboard.bishopAttacks(square, occupancy) & (bitboards[attacker + Piece.BISHOP.value] | queens):
+            return True
+        if Bitboard.rookAttacks(square, occupancy) & (bitboards[attacker + Piece.ROOK.value] | queens):
+            return True
+        return False
+
+    def attackersTo(self, square : int, attacker : int, occupancy : int, bitboards : list[int] = None) -> int:
+        """Returns a bitboard of every piece of colour value attacker that attacks square given occupancy,
+        on the board's bitboards unless others are given"""
+        if bitboards is None:
+            bitboards = self.bitboards
+        queens = bitboards[attacker + Piece.QUEEN.value]
+        return (Bitboard.KNIGHTATTACKS[square] & bitboards[attacker + Piece.KNIGHT.value]) | \
+               (Bitboard.KINGATTACKS[square] & bitboards[attacker + Piece.KING.value]) | \
+               (Bitboard.PAWNATTACKS[(attacker >> 4) ^ 1][square] & bitboards[attacker + Piece.PAWN.value]) | \
+               (Bitboard.bishopAttacks(square, occupancy) & (bitboards[attacker + Piece.BISHOP.value] | queens)) | \
+               (Bitboard.rookAttacks(square, occupancy) & (bitboards[attacker + Piece.ROOK.value] | queens))
+
+    def leastValuableAttacker(self, square : int, attacker : int, occupancy : int) -> tuple[int, int]:
+        """(bit, piece type) of the cheapest piece of colour value attacker that attacks square given occupancy, (0, 0) if none.
+        Pieces not in occupancy are treated as already gone, so sliders behind them are found"""
+        attackers = self.attackersTo(square, attacker, occupancy) & occupancy
+        if attackers:
+            for pieceType in (Piece.PAWN.value, Piece.KNIGHT.value, Piece.BISHOP.value, Piece.ROOK.value, Piece.QUEEN.value, Piece.KING.value):
+                if pieces := attackers & self.bitboards[attacker + pieceType]:
+                    return (pieces & -pieces, pieceType)
+        return (0, 0)
+
+    def staticExchange(self, move : int) -> int:
+        """Material the side to move wins (negative if it loses) by making move and then both sides recapturing on
+        its target square with their least valuable attacker for as long as it pays. Pins are not taken into account"""
+        values = Evaluation.EXCHANGEVALUES
+        original = move & 0b111111
+        target = (move >> TARGETSHIFT) & 0b111111
+        occupancy = self.occupied ^ (1 << original)
+
+        gains = [values[Move.victimOf(move)]]
+        onSquare = self.board[original] & 0b000111 #Type of the piece standing on target, to be captured next
+        if promotion := (move >> PROMOTIONSHIFT) & 0b111:
+            gains[0] += values[promotion] - values[Piece.PAWN.value]
+            onSquare = promotion
+        if (move >> TYPESHIFT) & 0b11 == MoveType.ENPASSANT.value:
+            occupancy ^= 1 << ((original & 56) + (target & 7))
+
+        side = Piece.flipColour(self.colourToMove).value
+        while True:
+            bit, pieceType = self.leastValuableAttacker(target, side, occupancy)
+            if not bit:
+                break
+            gains.append(values[onSquare] - gains[-1])
+            if max(-gains[-2], gains[-1]) < 0: #This capture loses whatever follows, so the side stops before it
+                gains.pop()
+                break
+            occupancy ^= bit
+            onSquare = pieceType
+            side ^= 0b011000
+
+        #Each side may stop capturing when continuing loses, resolved from the last capture back
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def isRepetition(self, count : int = 1) -> bool:
+        """Whether the current position occurred at least count times before. Only positions since the last pawn move
+        or capture are compared (every second one, with the same side to move), so this is O(halfmove clock)"""
+        key = self.__zobristKey
+        history = self.keyHistory
+        end = len(history) - min(self.halfMove, len(history)) - 1
+        for index in range(len(history) - 2, end, -2):
+            if history[index] == key:
+                count -= 1
+                if not count:
+                    return True
         return False
 
+    def isFiftyMoveDraw(self) -> bool:
+        return self.halfMove >= 100
+
+    def isInsufficientMaterial(self) -> bool:
+        """Neither side can mate: only kings, plus at most one knight or bishop, or bishops all on one square colour"""
+        bitboards = self.bitboards
+        white, black = Piece.WHITE.value, Piece.BLACK.value
+        for pieceType in (Piece.PAWN.value, Piece.ROOK.value, Piece.QUEEN.value):
+            if bitboards[white + pieceType] | bitboards[black + pieceType]:
+                return False
+        knights = bitboards[white + Piece.KNIGHT.value] | bitboards[black + Piece.KNIGHT.value]
+        bishops = bitboards[white + Piece.BISHOP.value] | bitboards[black + Piece.BISHOP.value]
+        if not bishops:
+            return not knights & (knights - 1) #A lone knight
+        if knights:
+            return False
+        return not bishops & Bitboard.DARKSQUARES or not bishops & ~Bitboard.DARKSQUARES
+
+    def isDraw(self, repetitions : int = 1) -> bool:
+        """Draw by the fifty-move rule, insufficient material or a position repeated repetitions times before.
+        A search uses 1 (a repetition inside the tree can be forced again), a game 2 (threefold repetition)"""
+        return self.halfMove >= 100 or self.isRepetition(repetitions) or self.isInsufficientMaterial()
+
     def confirmMove(self, move : Move):
-        self.__makeMove(move)
-        for x in self.generateAllMoves(self.colourToMove).values():
-            if x:
-                return #Found a move
-        
+        self.makeMove(move)
+        if self.hasLegalMove():
+            if self.isDraw(2):
+                self.gameState = 1
+            return #Found a move
 
         #No moves found
         if self.curKingThreat():
@@ -437,204 +849,247 @@ class Board():
         else:
             self.gameState = 1
     
-    def __makeMove(self, move : Move):
-        originalPos = move.getOriginal()
-        target = move.getTarget()
-        movingPiece = self.getBoardValue(originalPos)
-        currentColourPieces = self.getCurrentColourPieces()
-        oppositeColourPieces = self.getOppositeColourPieces()
-
-        if move.type == MoveType.PROMOTION:
-            currentColourPieces[Piece.PAWN].remove(originalPos) #Remove pawn
-            if capturedPiece := move.getTargetValue():
-                oppositeColourPieces[Piece.typeFromtInt(capturedPiece)].remove(target) #Remove target
-            currentColourPieces[move.promotion].add(target) #Add promoted piece
-
-            self.setBoardValue(move.promotion.value, move.getTarget())
-            self.setBoardValue(0, originalPos)
-
-            self.colourToMove = Piece.flipColour(self.colourToMove)
-            return
-        
-        #Disabling Castling
-        match Piece.typeFromtInt(movingPiece):
-            case Piece.KING:
-                if self.colourToMove == Piece.WHITE:
-                    self.wKingMoved = True
-                    self.wKingCastle, self.wQueenCastle = False, False
-                else:
-                    self.bKingMoved = True
-                    self.bKingCastle, self.bQueenCastle = False, False
-            case Piece.ROOK:
-                rookFile = move.getOriginal()[1]
-                if self.colourToMove == Piece.WHITE:
-                    if rookFile == 7:
-                        self.wKRookMoved = True
-                        self.wKingCastle = False
-                    elif rookFile == 0:
-                        self.wQRookMoved = True
-                        self.wQueenCastle = False
-                else:
-                    if rookFile == 7:
-                        self.bKRookMoved = True
-                        self.bKingCastle = False
-                    elif rookFile == 0:
-                        self.bQRookMoved = True
-                        self.bKingCastle = False
-
-        #Adding / removing en passant square
-        if movingPiece == Piece.WHITE.value + Piece.PAWN.value and target[0] == 3: 
-            self.enPassant.append(Board.posChange(move.getTarget(), (-1,0)))
-        elif movingPiece == Piece.BLACK.value + Piece.PAWN.value and target[0] == 4:
-            self.enPassant.append(Board.posChange(move.getTarget(), (1,0)))
+    def makeMove(self, move : int):
+        """Makes a packed move (a Move is also accepted). The move is assumed to be legal"""
+        if isinstance(move, Move):
+            move = move.encoded
+        originalPos = move & 0b111111
+        target = (move >> TARGETSHIFT) & 0b111111
+        movingPiece = self.board[originalPos]
+        colour = self.colourToMove.value
+
+        #Saving what the move can't be undone from: castling rights, en passant square, captured piece, halfmove clock and key
+        rights = self.castling
+        self.undoStack.append(rights | ((self.enPassant + 1) << UNDOENPASSANTSHIFT) | ((move >> CAPTURESHIFT) << UNDOCAPTURESHIFT) | (self.halfMove << UNDOHALFMOVESHIFT))
+        self.keyHistory.append(self.__zobristKey)
+
+        #Halfmove clock, reset by pawn moves and captures which can't be undone in a game
+        if Piece.isType(movingPiece, Piece.PAWN) or move >> CAPTURESHIFT:
+            self.halfMove = 0
         else:
-            self.enPassant.append((-1,-1)) #Invalid enPassant tile
-            
-        #Setting board values when castling
-        if move.type == MoveType.CASTLING:
-            currentColourPieces[Piece.KING].remove(originalPos)
-            currentColourPieces[Piece.KING].add(target)
-            
-            rank = target[0]
-            match target[1]:
-                case 6: #King side castle
-                    currentColourPieces[Piece.ROOK].remove((rank, 7))
-                    currentColourPieces[Piece.ROOK].add((rank, 5))
-
-                    self.setBoardValue(0, (rank, 7))
-                    self.setBoardValue(Piece.ROOK.value + self.colourToMove.value, (rank, 5))
-                case 2: #Queen side castle
-                    currentColourPieces[Piece.ROOK].remove((rank, 0))
-                    currentColourPieces[Piece.ROOK].add((rank, 3))
-
-                    self.setBoardValue(0, (rank, 0))
-                    self.setBoardValue(Piece.ROOK.value + self.colourToMove.value, (rank, 3))
-                case _:
-                    raise ValueError("Castling target is wrong")
-
-            self.setBoardValue(movingPiece, target)
-            self.setBoardValue(0, originalPos)
-
-            self.colourToMove = Piece.flipColour(self.colourToMove)
-            return
-    
-        #Setting board values for any other case
-        currentColourPieces[Piece.typeFromtInt(movingPiece)].remove(originalPos)
-        currentColourPieces[Piece.typeFromtInt(movingPiece)].add(target)
-
-        #If there is a captured piece, remove it from known piece list
-        if capturedPiece := move.getTargetValue():
-            oppositeColourPieces[Piece.typeFromtInt(capturedPiece)].remove(target)
-            
-        self.setBoardValue(movingPiece, target)
-        self.setBoardValue(0, originalPos)
+            self.halfMove += 1
+        if colour == Piece.BLACK.value:
+            self.fullMove += 1
 
-        self.colourToMove = Piece.flipColour(self.colourToMove)
+        #Disabling Castling, a move from or onto a king or rook starting square loses the matching right
+        self.__zobristKey ^= Zobrist.CASTLINGKEYS[rights] ^ self.__enPassantKey() ^ Zobrist.SIDEKEY
+        self.castling &= CASTLINGMASKS[originalPos] & CASTLINGMASKS[target]
 
+        #Adding / removing en passant square
+        #Only set when an enemy pawn can capture, otherwise the same position would get two keys and repetitions be missed
+        self.enPassant = -1 #Invalid enPassant tile
+        if Piece.isType(movingPiece, Piece.PAWN) and abs(target - originalPos) == 16:
+            square = (target + originalPos) // 2
+            if Bitboard.PAWNATTACKS[colour >> 4][square] & self.bitboards[(colour ^ 0b11000) + Piece.PAWN.value]:
+                self.enPassant = square
+        self.__zobristKey ^= Zobrist.CASTLINGKEYS[self.castling] ^ self.__enPassantKey()
+
+        #If there is a captured piece, remove it first so the target square is free
+        if move >> CAPTURESHIFT:
+            self.__removePiece(target)
+        self.__removePiece(originalPos)
+
+        match (move >> TYPESHIFT) & 0b11:
+            case MoveType.PROMOTION.value:
+                self.__addPiece(((move >> PROMOTIONSHIFT) & 0b111) + colour, target)
+            case MoveType.ENPASSANT.value:
+                self.__addPiece(movingPiece, target)
+                self.__removePiece((originalPos & 56) + (target & 7)) #Captured pawn is beside the moving pawn
+            case MoveType.CASTLING.value:
+                self.__addPiece(movingPiece, target)
+                base = target & 56
+                match target & 7:
+                    case 6: #King side castle
+                        self.__removePiece(base + 7)
+                        self.__addPiece(Piece.ROOK.value + colour, base + 5)
+                    case 2: #Queen side castle
+                        self.__removePiece(base)
+                        self.__addPiece(Piece.ROOK.value + colour, base + 3)
+                    case _:
+                        raise ValueError("Castling target is wrong")
+            case _:
+                self.__addPiece(movingPiece, target)
 
-    def unmakeMove(self, move : Move):
         self.colourToMove = Piece.flipColour(self.colourToMove)
 
-        originalPos = move.getOriginal()
-        target = move.getTarget()
-        movingPiece = self.getBoardValue(target)
-        currentColourPieces = self.getCurrentColourPieces()
-        oppositeColourPieces = self.getOppositeColourPieces()
-
-        if move.initialMove:
-            match Piece.pieceType(movingPiece):
-                case Piece.KING.value:
-                    if self.colourToMove == Piece.WHITE:
-                        self.wKingMoved = False
-                        if not self.wKRookMoved:
-                            self.wKingCastle = True
-                        if not self.wQRookMoved:
-                            self.wQueenCastle = True
-                    else:
-                        self.bKingMoved = False
-                        if not self.bKRookMoved:
-                            self.bKingCastle = True
-                        if not self.bQRookMoved:
-                            self.bQueenCastle = True
-                case Piece.ROOK.value:
-                    if originalPos[1] == 0: #Queen side rook
-                        if self.colourToMove == Piece.WHITE:
-                            self.wQRookMoved = False
-                            if not self.wKingMoved:
-                                self.wQueenCastle = True
-                        else:
-                            self.bQRookMoved = False
-                            if not self.bKingMoved:
-                                self.bQueenCastle = True
-
-                    elif originalPos[1] == 7: #King side rook
-                        if self.colourToMove == Piece.WHITE:
-                            self.wKRookMoved = False
-                            if not self.wKingMoved:
-                                self.wKingCastle = True
-                        else:
-                            self.bKRookMoved = False
-                            if not self.bKingMoved:
-                                self.bKingCastle = True
-
-                case _:
-                    raise ValueError("Only rooks/kings will have initial move")
-
-        #Reinstating / removing en passant square
-        self.enPassant.pop()
-
-        if move.type == MoveType.PROMOTION:
-            currentColourPieces[move.promotion].remove(target)
-            currentColourPieces[Piece.PAWN].add(originalPos)
-            if capturedPiece := move.getTargetValue():
-                oppositeColourPieces[Piece.typeFromtInt(capturedPiece)].add(target)
-
-            self.setBoardValue(Piece.PAWN + Piece.pieceColour(move.getTargetValue()), originalPos)
-            self.setBoardValue(move.getTargetValue(), target)
-            return
-
-        if move.type == MoveType.CASTLING:
-            currentColourPieces[Piece.KING].remove(target)
-            currentColourPieces[Piece.KING].add(originalPos)
-            
-            rank = target[0]
-            match target[1]:
-                case 6: #King side castle
-                    currentColourPieces[Piece.ROOK].remove(rank, 5)
-                    currentColourPieces[Piece.ROOK].add(rank, 7)
-
-                    self.setBoardValue(Piece.ROOK.value + self.colourToMove.value + Piece.INITIAL.value, (rank, 7))
-                    self.setBoardValue(0, (rank, 5))
-                case 2: #Queen side castle
-                    currentColourPieces[Piece.ROOK].remove(rank, 3)
-                    currentColourPieces[Piece.ROOK].add(rank, 0)
-
-                    self.setBoardValue(Piece.ROOK.value + self.colourToMove.value + Piece.INITIAL.value, (rank, 0))
-                    self.setBoardValue(0, (rank, 3))
-                case _:
-                    raise ValueError("Castling target is wrong")
-
-            self.setBoardValue(movingPiece, originalPos)
-            self.setBoardValue(movingPiece, originalPos)
-            return
 
-        currentColourPieces[Piece.typeFromtInt(movingPiece)].remove(target)
-        currentColourPieces[Piece.typeFromtInt(movingPiece)].add(originalPos)
-        if capturedPiece := move.getTargetValue():
-            oppositeColourPieces[Piece.typeFromtInt(capturedPiece)].add(target)
+    def unmakeMove(self, move : int):
+        if isinstance(move, Move):
+            move = move.encoded
+        self.colourToMove = Piece.flipColour(self.colourToMove)
 
-        self.setBoardValue(self.getBoardValue(target), originalPos)
-        self.setBoardValue(move.getTargetValue(), target)
+        originalPos = move & 0b111111
+        target = (move >> TARGETSHIFT) & 0b111111
+        movingPiece = self.board[target]
+        colour = self.colourToMove.value
+
+        #Reinstating castling rights, en passant square and move counters from the undo record
+        record = self.undoStack.pop()
+        self.castling = record & 0b1111
+        self.enPassant = ((record >> UNDOENPASSANTSHIFT) & 0b1111111) - 1
+        self.halfMove = record >> UNDOHALFMOVESHIFT
+        if colour == Piece.BLACK.value:
+            self.fullMove -= 1
+
+        self.__removePiece(target)
+        match (move >> TYPESHIFT) & 0b11:
+            case MoveType.PROMOTION.value:
+                self.__addPiece(Piece.PAWN.value + colour, originalPos)
+            case MoveType.ENPASSANT.value:
+                self.__addPiece(movingPiece, originalPos)
+                self.__addPiece(Piece.PAWN.value + Piece.flipColour(self.colourToMove).value, (originalPos & 56) + (target & 7))
+            case MoveType.CASTLING.value:
+                self.__addPiece(movingPiece, originalPos)
+                base = target & 56
+                match target & 7:
+                    case 6: #King side castle
+                        self.__removePiece(base + 5)
+                        self.__addPiece(Piece.ROOK.value + colour, base + 7)
+                    case 2: #Queen side castle
+                        self.__removePiece(base + 3)
+                        self.__addPiece(Piece.ROOK.value + colour, base)
+                    case _:
+                        raise ValueError("Castling target is wrong")
+            case _:
+                self.__addPiece(movingPiece, originalPos)
+
+        if capturedPiece := (record >> UNDOCAPTURESHIFT) & 0b11111:
+            self.__addPiece(capturedPiece, target)
+        self.__zobristKey = self.keyHistory.pop() #The piece updates above changed it too, the saved key is simply restored
+
+    def __addToPieceList(self, piece : int, square : int):
+        index = self.pieceCounts[piece]
+        self.pieceSquares[piece * PIECECAPACITY + index] = square
+        self.pieceIndex[square] = index
+        self.pieceCounts[piece] = index + 1
+
+    def __addPiece(self, piece : int, square : int):
+        """Places piece on square, keeping the board, piece lists and bitboards in sync"""
+        self.board[square] = piece
+        self.__addToPieceList(piece, square)
+
+        self.__zobristKey ^= Zobrist.PIECEKEYS[piece][square]
+        self.midgameScore += Evaluation.MIDGAMETABLE[piece][square]
+        self.endgameScore += Evaluation.ENDGAMETABLE[piece][square]
+        self.phase += Evaluation.PHASEWEIGHTS[piece & 0b000111]
+
+        bit = 1 << square
+        self.bitboards[piece] |= bit
+        self.colourOccupancy[piece >> 4] |= bit
+        self.occupied |= bit
+
+    def __removePiece(self, square : int):
+        """Clears square, keeping the board, piece lists and bitboards in sync"""
+        piece = self.board[square]
+        self.board[square] = 0
+        #The last square of the piece's list fills the removed one's place
+        last = self.pieceCounts[piece] - 1
+        lastSquare = self.pieceSquares[piece * PIECECAPACITY + last]
+        index = self.pieceIndex[square]
+        self.pieceSquares[piece * PIECECAPACITY + index] = lastSquare
+        self.pieceIndex[lastSquare] = index
+        self.pieceCounts[piece] = last
+
+        self.__zobristKey ^= Zobrist.PIECEKEYS[piece][square]
+        self.midgameScore -= Evaluation.MIDGAMETABLE[piece][square]
+        self.endgameScore -= Evaluation.ENDGAMETABLE[piece][square]
+        self.phase -= Evaluation.PHASEWEIGHTS[piece & 0b000111]
+
+        bit = 1 << square
+        self.bitboards[piece] ^= bit
+        self.colourOccupancy[piece >> 4] ^= bit
+        self.occupied ^= bit
+
+    @property
+    def zobristKey(self) -> int:
+        """64 bit key of the position, updated incrementally by makeMove / unmakeMove"""
+        return self.__zobristKey
+
+    def computeZobristKey(self) -> int:
+        """Computes the position key from scratch, for checking the incremental key"""
+        key = Zobrist.CASTLINGKEYS[self.castling] ^ self.__enPassantKey()
+        if self.colourToMove == Piece.BLACK:
+            key ^= Zobrist.SIDEKEY
+        for square, piece in enumerate(self.board):
+            if piece:
+                key ^= Zobrist.PIECEKEYS[piece][square]
+        return key
+
+    def verifyIncremental(self):
+        """Raises an AssertionError if a value kept up to date by makeMove / unmakeMove differs from a full recompute"""
+        if self.__zobristKey != self.computeZobristKey():
+            raise AssertionError(f"Incremental Zobrist key is wrong: {self.toFEN()}")
+        if (self.midgameScore, self.endgameScore, self.phase) != Evaluation.computeScores(self.board):
+            raise AssertionError(f"Incremental evaluation {(self.midgameScore, self.endgameScore, self.phase)} != {Evaluation.computeScores(self.board)}: {self.toFEN()}")
+
+    def castlingRights(self) -> int:
+        """Castling rights as a bitmask: 1 white king side, 2 white queen side, 4 black king side, 8 black queen side"""
+        return self.castling
+
+    def setCastlingRights(self, rights : int):
+        """Sets the castling rights from a castlingRights bitmask"""
+        self.castling = rights
+
+    #Single castling rights, views of the castling bitmask
+    wKingCastle = _castlingFlag(1)
+    wQueenCastle = _castlingFlag(2)
+    bKingCastle = _castlingFlag(4)
+    bQueenCastle = _castlingFlag(8)
+
+    def piecePositions(self, piece : int) -> bytearray:
+        """Squares of every piece with the value piece (colour and type)"""
+        start = piece * PIECECAPACITY
+        return self.pieceSquares[start : start + self.pieceCounts[piece]]
+
+    def __pieceSets(self, colour : int) -> dict:
+        return {pieceType: set(self.piecePositions(colour + pieceType.value)) for pieceType in (Piece.PAWN, Piece.KNIGHT, Piece.BISHOP, Piece.ROOK, Piece.QUEEN, Piece.KING)}
+
+    @property
+    def whitePieces(self) -> dict:
+        """Squares of the white pieces by piece type, built from the piece lists"""
+        return self.__pieceSets(Piece.WHITE.value)
+
+    @property
+    def blackPieces(self) -> dict:
+        """Squares of the black pieces by piece type, built from the piece lists"""
+        return self.__pieceSets(Piece.BLACK.value)
+
+    def copy(self) -> "Board":
+        """Independent copy of the position and its move history as a plain Board, much cheaper than copy.deepcopy"""
+        board = Board.__new__(Board)
+        board.board = self.board[:]
+        board.pieceSquares = self.pieceSquares[:]
+        board.pieceCounts = self.pieceCounts[:]
+        board.pieceIndex = self.pieceIndex[:]
+        board.bitboards = self.bitboards[:]
+        board.colourOccupancy = self.colourOccupancy[:]
+        board.occupied = self.occupied
+        board.undoStack = self.undoStack[:]
+        board.keyHistory = self.keyHistory[:]
+        board.castling = self.castling
+        board.colourToMove = self.colourToMove
+        board.enPassant = self.enPassant
+        board.halfMove = self.halfMove
+        board.fullMove = self.fullMove
+        board.gameState = self.gameState
+        board.__zobristKey = self.__zobristKey
+        board.midgameScore, board.endgameScore, board.phase = self.midgameScore, self.endgameScore, self.phase
+        return board
+
+    def __enPassantKey(self) -> int:
+        if self.enPassant != -1:
+            return Zobrist.ENPASSANTKEYS[self.enPassant & 7]
+        return 0
 
     def printBoard(self):
-        for x in self.board:
-            print(x)
+        for rank in range(7, -1, -1):
+            print(list(self.board[rank * 8 : rank * 8 + 8]))
 
-    def getBoardValue(self, position) -> int:
-        return self.board[7-position[0]][position[1]]
+    def getBoardValue(self, square : int) -> int:
+        return self.board[square]
     
-    def setBoardValue(self, value, position):
-        self.board[7-position[0]][position[1]] = value
+    def setBoardValue(self, value, square : int):
+        self.board[square] = value
 
     def getCurrentColourPieces(self) -> dict:
         return self.blackPieces if self.colourToMove == Piece.BLACK else self.whitePieces
@@ -642,9 +1097,6 @@ class Board():
     def getOppositeColourPieces(self) -> dict:
         return self.whitePieces if self.colourToMove == Piece.BLACK else self.blackPieces
     
-    def isOutOfBounds(position):
-        return not(0 <= position[0] <= 7 and 0 <= position[1] <= 7)
-
     def algebraicNotationToRankFile(algebraic : str):
         """Takes a string in algebraic notation and returns the corresponding 0-indexed rank and file in the form (rank, file)"""
         fileMapping = {"a":0,"b":1,"c":2,"d":3,"e":4,"f":5,"g":6,"h":7}
@@ -656,14 +1108,22 @@ class Board():
             return (int(algebraic[1]) - 1, fileMapping[algebraic[0]])
         except KeyError:
             raise ValueError(f"Invalid algebraic notation: {algebraic}")
-    
-    def posChange(oldPos, change, multiplier=1):
-        return (oldPos[0] + change[0] * multiplier, oldPos[1] + change[1] * multiplier)
+
+    def algebraicNotationToSquare(algebraic : str) -> int:
+        """Takes a string in algebraic notation and returns the corresponding square index (rank * 8 + file)"""
+        rank, file = Board.algebraicNotationToRankFile(algebraic)
+        return rank * 8 + file
+
+    def squareToAlgebraic(square : int) -> str:
+        return "abcdefgh"[square % 8] + str(square // 8 + 1)
+
+    def squareToRankFile(square : int) -> tuple[int, int]:
+        return divmod(square, 8)
 
 if __name__=="__main__":
     # "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQK2R w KQkq - 0 1"
     game = Board()
-    pos = Board.algebraicNotationToRankFile("e2")
+    pos = Board.algebraicNotationToSquare("e2")
     temp = game.moveGenerator(game.getBoardValue(pos), pos)
     counter = 1
     if temp:
@@ -0,0 +1,159 @@
+"""Opt-in instrumentation of Board: calls and time of its hot methods, and moves generated / rejected per piece type
+
+InstrumentedBoard is a Board subclass with the counting methods, a plain Board is left untouched, so choosing the class
+at construction time is the switch and boards built without it pay nothing.
+Times are inclusive: threatChecker's time also holds the makeMove / unmakeMove it calls, which count on their own too.
+
+Rejected moves are the moves a piece could make if checks and pins were ignored that the legality masks filter out
+(for the king, steps onto attacked squares). They are counted from the piece's target bitboards, so counting doesn't
+generate anything twice. Every move generation of the board counts, whichever method asked for it.
+generateStagedMoves is a generator, its time is the time spent producing moves, not the caller's time between them.
+
+Usage:
+    python Instrumentation.py ["<FEN>"] [--depth N] [--search] [--json PATH] [--profile PATH]
+"""
+import argparse
+import cProfile
+import functools
+import inspect
+import json
+import pstats
+import time
+import Bitboard
+import GameBoard
+from GameBoard import Piece, MoveType, TYPESHIFT
+from Perft import perft
+from Search import Search
+
+TIMEDMETHODS = ("generateLegalMoves", "generateStagedMoves", "legalityMasks", "hasLegalMove", "moveGenerator", "threatChecker",
+    "curKingThreat", "makeMove", "unmakeMove", "generateAllMoves")
+PIECENAMES = {Piece.PAWN.value: "pawn", Piece.KNIGHT.value: "knight", Piece.BISHOP.value: "bishop",
+    Piece.ROOK.value: "rook", Piece.QUEEN.value: "queen", Piece.KING.value: "king"}
+
+class BoardStats():
+    """calls[name] and seconds[name] of every timed method, generated[pieceType] and rejected[pieceType] move counts"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = dict.fromkeys(TIMEDMETHODS, 0)
+        self.seconds = dict.fromkeys(TIMEDMETHODS, 0.0)
+        self.generated = dict.fromkeys(PIECENAMES, 0)
+        self.rejected = dict.fromkeys(PIECENAMES, 0)
+
+    def snapshot(self) -> dict:
+        """Plain dict of the counters, ready for json.dumps"""
+        methods = {}
+        for name in TIMEDMETHODS:
+            calls = self.calls[name]
+            methods[name] = {"calls": calls, "seconds": round(self.seconds[name], 6),
+                "meanMicroseconds": round(self.seconds[name] / calls * 1e6, 3) if calls else 0.0}
+        moves = {PIECENAMES[pieceType]: {"generated": self.generated[pieceType], "rejected": self.rejected[pieceType]} for pieceType in PIECENAMES}
+        return {"methods": methods, "moves": moves}
+
+    def toJSON(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+def _timed(name : str):
+    method = getattr(GameBoard.Board, name)
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def timedGenerator(self, *args, **kwargs):
+            self.stats.calls[name] += 1
+            generator = method(self, *args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    self.stats.seconds[name] += time.perf_counter() - start
+                yield item
+        return timedGenerator
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.stats.seconds[name] += time.perf_counter() - start
+            self.stats.calls[name] += 1
+    return timed
+
+class InstrumentedBoard(GameBoard.Board):
+    """Board counting its work in stats, see the module docstring"""
+    __slots__ = ("stats",)
+
+    def __init__(self, initialState=None):
+        self.stats = BoardStats()
+        super().__init__(initialState)
+
+    def generatePieceMoves(self, piece : int, square : int, legalityMasks : tuple, moveList, targetMask : int = Bitboard.FULL):
+        start = len(moveList)
+        super().generatePieceMoves(piece, square, legalityMasks, moveList, targetMask)
+        legal = len(moveList) - start
+
+        pieceType = Piece.pieceType(piece)
+        ownPieces = self.colourOccupancy[piece >> 4]
+        match pieceType:
+            case Piece.PAWN.value:
+                targets = self.pawnTargets(piece, square) & targetMask
+                pseudoLegal = (targets & ~Bitboard.BACKRANKS).bit_count() + 4 * (targets & Bitboard.BACKRANKS).bit_count() #4 promotions each
+                enPassant = self.enPassant
+                if enPassant != -1 and Bitboard.PAWNATTACKS[piece >> 4][square] & (1 << enPassant) and targetMask & (1 << ((square & 56) + (enPassant & 7))):
+                    pseudoLegal += 1
+            case Piece.KING.value: #King moves are always tested against attacks, so count the steps it could take instead
+                steps = Bitboard.KINGATTACKS[square] & ~ownPieces & targetMask
+                castles = sum(1 for index in range(start, len(moveList)) if (moveList[index] >> TYPESHIFT) & 0b11 == MoveType.CASTLING.value)
+                pseudoLegal = steps.bit_count() + castles
+            case Piece.KNIGHT.value:
+                pseudoLegal = (Bitboard.KNIGHTATTACKS[square] & ~ownPieces & targetMask).bit_count()
+            case Piece.BISHOP.value:
+                pseudoLegal = (Bitboard.bishopAttacks(square, self.occupied) & ~ownPieces & targetMask).bit_count()
+            case Piece.ROOK.value:
+                pseudoLegal = (Bitboard.rookAttacks(square, self.occupied) & ~ownPieces & targetMask).bit_count()
+            case _:
+                pseudoLegal = (Bitboard.queenAttacks(square, self.occupied) & ~ownPieces & targetMask).bit_count()
+        self.stats.generated[pieceType] += legal
+        self.stats.rejected[pieceType] += pseudoLegal - legal
+
+for _name in TIMEDMETHODS:
+    setattr(InstrumentedBoard, _name, _timed(_name))
+
+def profile(workload, path : str = None) -> pstats.Stats:
+    """Runs workload() under cProfile, writes the pstats dump to path if given and returns the stats"""
+    profiler = cProfile.Profile()
+    profiler.runcall(workload)
+    if path:
+        profiler.dump_stats(path)
+    return pstats.Stats(profiler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs perft or a search on an instrumented board and prints its counters as JSON")
+    parser.add_argument("FEN", nargs="?", help="Position to run perft from, the start position if omitted")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--search", action="store_true", help="Search to depth instead of running perft, like a production worker")
+    parser.add_argument("--json", metavar="PATH", help="Write the snapshot to PATH instead of stdout")
+    parser.add_argument("--profile", metavar="PATH", help="Also run the workload under cProfile and write the pstats dump to PATH")
+    args = parser.parse_args()
+
+    board = InstrumentedBoard(args.FEN)
+    if args.search:
+        workload = lambda: Search().search(board, args.depth)
+    else:
+        workload = lambda: perft(board, args.depth)
+    if args.profile:
+        profile(workload, args.profile).sort_stats("cumulative").print_stats(15)
+    else:
+        workload()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            file.write(board.stats.toJSON(indent=2) + "\n")
+    else:
+        print(board.stats.toJSON(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Quiet move ordering heuristics for Search: killer moves, history and counter moves
+
+Every table is a flat array preallocated once and indexed by integer squares, so updating them in the search allocates nothing.
+A move's from / to index is its low 12 bits: original square | target square << 6 (see Move.encode).
+"""
+from array import array
+from GameBoard import Move
+
+KILLERSLOTS = 2
+HISTORYMAX = 1 << 20 #History scores are halved when one reaches this either way, so they stay in range of the array
+
+class MoveOrdering():
+    """killers[ply * KILLERSLOTS + slot]: quiet moves that caused a cutoff at the same ply in a sibling node
+    history[colourIndex * 4096 + fromTo]: how often a quiet move caused a cutoff, weighted by depth squared
+    counterMoves[fromTo of the previous move]: the quiet move that last refuted it
+    """
+    def __init__(self, maxPly : int = 128):
+        self.maxPly = maxPly
+        self.killers = array("I", bytes(4 * maxPly * KILLERSLOTS))
+        self.history = array("i", bytes(4 * 2 * 4096))
+        self.counterMoves = array("I", bytes(4 * 4096))
+
+    def clear(self):
+        for table in (self.killers, self.history, self.counterMoves):
+            table[:] = array(table.typecode, bytes(table.itemsize * len(table)))
+
+    def newSearch(self):
+        """Killers belong to the plies of the previous position, history and counter moves are kept but aged"""
+        self.killers[:] = array("I", bytes(4 * len(self.killers)))
+        self.age()
+
+    def age(self):
+        """Halves the history, called between iterations so recent cutoffs outweigh old ones"""
+        history = self.history
+        for index in range(len(history)):
+            if history[index]:
+                history[index] = int(history[index] / 2) #Towards zero, so penalties fade out too
+
+    def killersAt(self, ply : int, previousMove : int = 0) -> tuple[int, ...]:
+        """Killer moves of ply, then the counter move of previousMove, for Board.generateStagedMoves"""
+        index = ply * KILLERSLOTS
+        return (self.killers[index], self.killers[index + 1], self.counterMoves[previousMove & 0xFFF] if previousMove else 0)
+
+    def historyKey(self, colourIndex : int):
+        """Sort key putting quiet moves with the most history first"""
+        history = self.history
+        offset = colourIndex * 4096
+        return lambda move: -history[offset + (move & 0xFFF)]
+
+    def update(self, colourIndex : int, ply : int, move : int, previousMove : int, depth : int, triedQuiets = ()):
+        """Records a quiet move that caused a cutoff. Quiet moves searched before it without a cutoff lose history"""
+        index = ply * KILLERSLOTS
+        if self.killers[index] != move:
+            self.killers[index + 1] = self.killers[index]
+            self.killers[index] = move
+        if previousMove:
+            self.counterMoves[previousMove & 0xFFF] = move
+
+        history = self.history
+        offset = colourIndex * 4096
+        bonus = depth * depth
+        largest = 0
+        for tried in triedQuiets:
+            if tried != move:
+                history[offset + (tried & 0xFFF)] -= bonus
+                largest = max(largest, -history[offset + (tried & 0xFFF)])
+        history[offset + (move & 0xFFF)] += bonus
+        if max(largest, history[offset + (move & 0xFFF)]) >= HISTORYMAX:
+            self.age()
+
+    def snapshot(self, top : int = 10) -> dict:
+        """Readable contents of the tables: killers per ply, the highest history scores per colour and the counter moves"""
+        def name(move):
+            return Move.encodedToAlgebraic(move) if move else None
+
+        killers = {}
+        for ply in range(self.maxPly):
+            slots = [name(x) for x in self.killers[ply * KILLERSLOTS : (ply + 1) * KILLERSLOTS] if x]
+            if slots:
+                killers[ply] = slots
+
+        history = {}
+        for colourIndex, colour in enumerate(("white", "black")):
+            scores = self.history[colourIndex * 4096 : (colourIndex + 1) * 4096]
+            best = sorted((index for index in range(4096) if scores[index] > 0), key=lambda x: -scores[x])[:top]
+            history[colour] = {name(index): scores[index] for index in best}
+
+        counterMoves = {name(index): name(move) for index, move in enumerate(self.counterMoves) if move}
+        return {"killers": killers, "history": history, "counterMoves": counterMoves}
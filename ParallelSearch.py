@@ -0,0 +1,143 @@
+"""Lazy SMP: the same position searched by several processes sharing one transposition table
+
+Every worker runs the ordinary iterative deepening Search on its own Board built from a FEN String.
+They only cooperate through the table, which lives in shared memory: results one worker stores cut off or order
+the moves of the others, so together they reach a depth sooner than one process would.
+Worker 0 is the main worker, its limits decide when the search ends, the helpers are then stopped through a shared flag.
+
+Entries are written without locks. The table stores each key XORed with its entry's data, so an entry half overwritten
+by another process fails the key check and reads as a miss.
+The helpers are diversified by depth: odd numbered helpers search one ply deeper than the main worker at every iteration,
+so they fill the table with entries the others haven't searched yet rather than repeating the main worker's tree.
+
+Usage:
+    python ParallelSearch.py ["<FEN>"] [--workers N] [--depth N] [--time SECONDS] [--hash MB]
+    python ParallelSearch.py --bench [--workers N] [--depth N] [--hash MB]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import GameBoard
+from GameBoard import Move
+from Search import Search, SearchResult
+from TranspositionTable import TranspositionTable
+
+#Middlegame positions for measuring time to depth
+BENCHMARKPOSITIONS = (
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+)
+
+#Per process state of a pool worker, set up once by _initWorker
+_tableMemory = None
+_stopMemory = None
+_search = None
+
+def _initWorker(tableName : str, stopName : str, sizeMB : float):
+    global _tableMemory, _stopMemory, _search
+    _tableMemory = shared_memory.SharedMemory(tableName)
+    _stopMemory = shared_memory.SharedMemory(stopName)
+    _search = Search(table=TranspositionTable(sizeMB, _tableMemory.buf))
+
+def _searchWorker(FEN : str, index : int, generation : int, maxDepth : int, maxNodes : int, maxTime : float) -> tuple:
+    """Runs one worker's search, returns the fields of its SearchResult (plain values pickle cheaply)"""
+    board = GameBoard.Board(FEN)
+    stopFlag = _stopMemory.buf
+    _search.table.generation = generation - 1 #Search.search ages the table to generation, the same in every worker
+    if index == 0:
+        result = _search.search(board, maxDepth, maxNodes, maxTime, stopCondition=lambda: stopFlag[0])
+    else: #Helpers keep deepening until the main worker is done
+        result = _search.search(board, stopCondition=lambda: stopFlag[0], depthOffset=index % 2)
+    return (result.bestMove, result.score, result.pv, result.depth, result.nodes, result.elapsed)
+
+class ParallelSearch():
+    """Pool of worker processes and the shared table they search with. Close it (or use it in a with block) to
+    stop the processes and free the shared memory"""
+    def __init__(self, workers : int = None, hashMB : float = 16):
+        self.workers = workers or os.cpu_count() or 1
+        self.hashMB = hashMB
+        self.__tableMemory = shared_memory.SharedMemory(create=True, size=TranspositionTable.bufferSize(hashMB))
+        self.__stopMemory = shared_memory.SharedMemory(create=True, size=1)
+        self.table = TranspositionTable(hashMB, self.__tableMemory.buf)
+        self.table.clear()
+        self.__pool = ProcessPoolExecutor(self.workers, initializer=_initWorker, initargs=(self.__tableMemory.name, self.__stopMemory.name, hashMB))
+
+    def search(self, board : GameBoard.Board, maxDepth : int = None, maxNodes : int = None, maxTime : float = None) -> SearchResult:
+        """Searches board with every worker and returns the result of the deepest completed iteration.
+        maxNodes limits the main worker only, the total searched across workers is reported in nodes"""
+        FEN = board.toFEN()
+        self.table.newSearch()
+        self.__stopMemory.buf[0] = 0
+
+        start = time.perf_counter()
+        futures = [self.__pool.submit(_searchWorker, FEN, index, self.table.generation, maxDepth, maxNodes, maxTime) for index in range(self.workers)]
+        try:
+            futures[0].result()
+        finally: #Also when the main worker failed, or the helpers would deepen forever
+            self.__stopMemory.buf[0] = 1
+        results = [SearchResult(*future.result()) for future in futures]
+        elapsed = time.perf_counter() - start
+
+        best = max(results, key=lambda x: x.depth) #max keeps the first, so the main worker wins ties
+        return SearchResult(best.bestMove, best.score, best.pv, best.depth, sum(x.nodes for x in results), elapsed)
+
+    def close(self):
+        self.__pool.shutdown()
+        self.table = None #Release the views before closing the memory they point into
+        self.__tableMemory.close()
+        self.__tableMemory.unlink()
+        self.__stopMemory.close()
+        self.__stopMemory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def runBenchmark(workers : int, depth : int = 5, hashMB : float = 16):
+    """Times searching every benchmark position to depth with 1 worker and with workers, and prints the speedup.
+    Efficiency is the speedup per worker, 1.0 would be perfect scaling"""
+    times = {}
+    for count in sorted({1, workers}):
+        with ParallelSearch(count, hashMB) as engine:
+            times[count] = []
+            for FEN in BENCHMARKPOSITIONS:
+                engine.table.clear()
+                result = engine.search(GameBoard.Board(FEN), maxDepth=depth)
+                times[count].append(result.elapsed)
+                print(f"workers {count:>2}  {result.elapsed:7.2f}s  nodes {result.nodes:>9}  bestmove {Move.encodedToAlgebraic(result.bestMove)}  {FEN}")
+
+    serial = sum(times[1])
+    parallel = sum(times[workers])
+    speedup = serial / parallel
+    print(f"Time to depth {depth}: {serial:.2f}s with 1 worker, {parallel:.2f}s with {workers}")
+    print(f"Speedup {speedup:.2f}x, efficiency {speedup / workers:.2f} per worker")
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches a position for the best move with several processes")
+    parser.add_argument("FEN", nargs="?", help="Position to search, the start position if omitted")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default one per core)")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--time", type=float, help="Seconds to search for")
+    parser.add_argument("--hash", type=float, default=16, metavar="MB")
+    parser.add_argument("--bench", action="store_true", help="Measure the time to depth speedup over a single worker")
+    args = parser.parse_args()
+    if args.depth is None and args.time is None:
+        args.depth = 5
+
+    if args.bench:
+        runBenchmark(args.workers, args.depth, args.hash)
+        return
+
+    with ParallelSearch(args.workers, args.hash) as engine:
+        result = engine.search(GameBoard.Board(args.FEN), args.depth, maxTime=args.time)
+    print(result)
+    print(f"bestmove {Move.encodedToAlgebraic(result.bestMove) if result.bestMove else '(none)'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Perft: counts the leaf nodes of the legal move tree to check and time move generation
+
+Usage:
+    python Perft.py "<FEN>" <depth> [--divide] [--hash [MB]]
+    python Perft.py --bench [--max-nodes N] [--hash [MB]]
+"""
+import argparse
+import time
+import GameBoard
+from TranspositionTable import TranspositionTable, Bound
+
+#(name, FEN, ((depth, expected nodes), ...)) - the standard test positions from the chess programming wiki
+BENCHMARKPOSITIONS = (
+    ("Start position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        ((1, 20), (2, 400), (3, 8902), (4, 197281), (5, 4865609))),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        ((1, 48), (2, 2039), (3, 97862), (4, 4085603))),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        ((1, 14), (2, 191), (3, 2812), (4, 43238), (5, 674624))),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        ((1, 6), (2, 264), (3, 9467), (4, 422333))),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        ((1, 44), (2, 1486), (3, 62379), (4, 2103487))),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        ((1, 46), (2, 2079), (3, 89890), (4, 3894594))),
+    ("En passant discovers check", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+        ((1, 18), (2, 92), (3, 1670), (4, 10138), (5, 185429), (6, 1134888))),
+    ("En passant capture gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+        ((1, 15), (2, 126), (3, 1928), (4, 13931), (5, 206379), (6, 1440467))),
+    ("Castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+        ((1, 15), (2, 66), (3, 1198), (4, 6399), (5, 120330), (6, 661072))),
+    ("Castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+        ((1, 44), (2, 1494), (3, 50509), (4, 1720476))),
+    ("Promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+        ((1, 11), (2, 133), (3, 1442), (4, 19174), (5, 266199), (6, 3821001))),
+    ("Underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+        ((1, 6), (2, 27), (3, 273), (4, 1329), (5, 18135), (6, 92683))),
+    ("Self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+        ((1, 2), (2, 6), (3, 13), (4, 63), (5, 382), (6, 2217))),
+)
+
+def perft(board : GameBoard.Board, depth : int, table : TranspositionTable = None) -> int:
+    """Counts the leaf nodes depth plies below board. table caches subtree counts of transposed positions"""
+    if depth == 0:
+        return 1
+
+    if table is not None:
+        entry = table.probe(board.zobristKey)
+        if entry and entry[0] == depth: #Counts are only valid for the same depth
+            return entry[1]
+
+    moves = board.generateLegalMoves()
+    if depth == 1: #Bulk counting, the leaves don't need to be made
+        nodes = len(moves)
+    else:
+        nodes = 0
+        for move in moves:
+            board.makeMove(move)
+            nodes += perft(board, depth - 1, table)
+            board.unmakeMove(move)
+
+    if table is not None:
+        table.store(board.zobristKey, depth, nodes, Bound.EXACT)
+    return nodes
+
+def divide(board : GameBoard.Board, depth : int, table : TranspositionTable = None) -> dict[str, int]:
+    """Perft split by root move, for comparing against another engine to find the faulty move"""
+    result = {}
+    for move in board.generateLegalMoves():
+        board.makeMove(move)
+        result[GameBoard.Move.encodedToAlgebraic(move)] = perft(board, depth - 1, table)
+        board.unmakeMove(move)
+    return dict(sorted(result.items()))
+
+def runBenchmark(maxNodes : int = 200_000, hashMB : float = None) -> bool:
+    """Runs every benchmark position at the deepest depth with at most maxNodes expected nodes.
+    Returns True if every count matched"""
+    allPassed = True
+    totalNodes = 0
+    totalTime = 0
+    for name, FEN, expectedCounts in BENCHMARKPOSITIONS:
+        depth, expected = max((x for x in expectedCounts if x[1] <= maxNodes), default=expectedCounts[0])
+        board = GameBoard.Board(FEN)
+
+        start = time.perf_counter()
+        nodes = perft(board, depth, TranspositionTable(hashMB) if hashMB else None)
+        elapsed = time.perf_counter() - start
+
+        totalNodes += nodes
+        totalTime += elapsed
+        passed = nodes == expected
+        allPassed &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} {name:<32} depth {depth}  nodes {nodes:>9} (expected {expected:>9})  {elapsed:7.2f}s  {nodes / elapsed:9.0f} nodes/s")
+
+    print(f"Total: {totalNodes} nodes in {totalTime:.2f}s, {totalNodes / totalTime:.0f} nodes/s")
+    return allPassed
+
+def main():
+    parser = argparse.ArgumentParser(description="Counts move generation leaf nodes from a position")
+    parser.add_argument("FEN", nargs="?", help="Position to search, the start position if omitted")
+    parser.add_argument("depth", nargs="?", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="Print the node count below every root move")
+    parser.add_argument("--hash", type=float, nargs="?", const=16, metavar="MB", help="Cache subtree counts of transposed positions in a table of MB megabytes (default 16)")
+    parser.add_argument("--bench", action="store_true", help="Run the standard position suite and check the node counts")
+    parser.add_argument("--max-nodes", type=int, default=200_000, help="Deepest benchmark depth to run, by expected node count")
+    args = parser.parse_args()
+
+    if args.bench:
+        raise SystemExit(0 if runBenchmark(args.max_nodes, args.hash) else 1)
+
+    board = GameBoard.Board(args.FEN)
+    table = TranspositionTable(args.hash) if args.hash else None
+    start = time.perf_counter()
+    if args.divide:
+        result = divide(board, args.depth, table)
+        for move, nodes in result.items():
+            print(f"{move}: {nodes}")
+        nodes = sum(result.values())
+    else:
+        nodes = perft(board, args.depth, table)
+    elapsed = time.perf_counter() - start
+    print(f"Nodes: {nodes}\nTime: {elapsed:.2f}s\nNodes/s: {nodes / elapsed:.0f}")
+    if table:
+        print(f"Hash: {table.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Alpha-beta search over GameBoard.Board
+
+Negamax with iterative deepening, principal variation search, aspiration windows and a transposition table.
+Quiet moves are ordered by killer moves, counter moves and history (see MoveOrdering).
+At the horizon a quiescence search plays out captures and promotions until the position is quiet, skipping captures
+that lose material by static exchange evaluation or that can't bring the score near alpha (delta pruning).
+Moves are made and unmade on the searched board in place, it is left unchanged when the search returns.
+
+Usage:
+    python Search.py ["<FEN>"] [--depth N] [--nodes N] [--time SECONDS] [--hash MB]
+"""
+import argparse
+import time
+from array import array
+import GameBoard
+import Evaluation
+from GameBoard import Move, PROMOTIONSHIFT
+from TranspositionTable import TranspositionTable, Bound
+from MoveOrdering import MoveOrdering
+
+MATE = 100_000
+MATEBOUND = MATE - 1000 #Scores beyond this are forced mates
+INFINITY = 1_000_000
+MAXPLY = 128
+ASPIRATIONWINDOW = 50
+DELTAMARGIN = 200 #Positional gain a capture may add on top of the captured material
+
+class SearchResult():
+    def __init__(self, bestMove : int, score : int, pv : list[int], depth : int, nodes : int, elapsed : float):
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nps = int(nodes / elapsed) if elapsed > 0 else 0
+
+    def scoreText(self) -> str:
+        """Centipawns, or mate in N moves (negative if being mated)"""
+        if self.score > MATEBOUND:
+            return f"mate {(MATE - self.score + 1) // 2}"
+        if self.score < -MATEBOUND:
+            return f"mate -{(MATE + self.score) // 2}"
+        return f"cp {self.score}"
+
+    def __repr__(self) -> str:
+        return f"depth {self.depth} score {self.scoreText()} nodes {self.nodes} nps {self.nps} pv {' '.join(Move.encodedToAlgebraic(x) for x in self.pv)}"
+
+def _scoreToTable(score : int, ply : int) -> int:
+    """Mate scores are stored relative to the node, not the root"""
+    if score > MATEBOUND:
+        return score + ply
+    if score < -MATEBOUND:
+        return score - ply
+    return score
+
+def _scoreFromTable(score : int, ply : int) -> int:
+    if score > MATEBOUND:
+        return score - ply
+    if score < -MATEBOUND:
+        return score + ply
+    return score
+
+class Search():
+    def __init__(self, hashMB : float = 16, table : TranspositionTable = None):
+        self.table = table if table is not None else TranspositionTable(hashMB)
+        self.pv = [[] for _ in range(MAXPLY + 1)]
+        self.ordering = MoveOrdering(MAXPLY)
+        self.moveStack = array("I", bytes(4 * MAXPLY)) #Move made at each ply of the current line
+        self.nodes = 0
+        self.stopped = False
+
+    def search(self, board : GameBoard.Board, maxDepth : int = None, maxNodes : int = None, maxTime : float = None, callback = None, stopCondition = None, depthOffset : int = 0) -> SearchResult:
+        """Iteratively deepens until a limit is reached and returns the result of the last completed depth
+
+        Parameters:
+        maxDepth, maxNodes, maxTime (seconds): search limits, at least one should be given
+        callback: called with the SearchResult of every completed depth
+        stopCondition: polled every 1024 nodes, the search stops once it returns True
+        depthOffset: plies added to the depth of every iteration, so a helper of a parallel search works ahead of the main worker
+        """
+        self.nodes = 0
+        self.stopped = False
+        self.maxNodes = maxNodes
+        self.stopCondition = stopCondition
+        self.startTime = time.perf_counter()
+        self.deadline = self.startTime + maxTime if maxTime else None
+        self.table.newSearch()
+        self.ordering.newSearch()
+        maxDepth = min(maxDepth or MAXPLY - 1, MAXPLY - 1)
+
+        rootMoves = board.generateLegalMoves()
+        if not rootMoves: #Checkmate or stalemate
+            return SearchResult(0, -MATE if board.inCheck() else 0, [], 0, 0, 0)
+
+        result = SearchResult(rootMoves[0], 0, [rootMoves[0]], 0, 0, 0)
+        score = 0
+        for iteration in range(1, maxDepth + 1):
+            depth = min(iteration + depthOffset, MAXPLY - 1)
+            if iteration > 1:
+                self.ordering.age()
+            if depth >= 4: #Aspiration window around the last score, widened on the failing side
+                window = ASPIRATIONWINDOW
+                alpha, beta = score - window, score + window
+                while True:
+                    newScore = self.__negamax(board, depth, alpha, beta, 0)
+                    if self.stopped:
+                        break
+                    if newScore <= alpha:
+                        alpha = max(newScore - window, -INFINITY)
+                    elif newScore >= beta:
+                        beta = min(newScore + window, INFINITY)
+                    else:
+                        break
+                    window *= 2
+            else:
+                newScore = self.__negamax(board, depth, -INFINITY, INFINITY, 0)
+
+            if self.stopped: #An unfinished iteration is discarded
+                break
+
+            score = newScore
+            result = SearchResult(self.pv[0][0], score, list(self.pv[0]), depth, self.nodes, time.perf_counter() - self.startTime)
+            if callback:
+                callback(result)
+            if abs(score) > MATEBOUND and MATE - abs(score) <= depth: #Found the shortest mate
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - self.startTime
+        result.nps = int(result.nodes / result.elapsed) if result.elapsed > 0 else 0
+        return result
+
+    def __limitReached(self) -> bool:
+        if self.maxNodes and self.nodes >= self.maxNodes:
+            return True
+        if self.nodes & 1023:
+            return False
+        return (self.deadline is not None and time.perf_counter() >= self.deadline) or (self.stopCondition is not None and self.stopCondition())
+
+    def __quiescence(self, board : GameBoard.Board, alpha : int, beta : int, ply : int, inCheck : bool) -> int:
+        """Searches captures and promotions only, the side to move may stand pat on the static evaluation unless in check"""
+        if self.stopped or self.__limitReached():
+            self.stopped = True
+            return 0
+        self.nodes += 1
+
+        if ply >= MAXPLY - 1:
+            if inCheck and not board.hasLegalMove(): #Mated at the horizon
+                return -MATE + ply
+            return Evaluation.evaluate(board)
+
+        if inCheck: #Every evasion is searched, standing pat could hide a mate
+            bestScore = -INFINITY
+            moves = board.generateStagedMoves()
+        else:
+            bestScore = Evaluation.evaluate(board)
+            if bestScore >= beta:
+                return bestScore
+            alpha = max(alpha, bestScore)
+            moves = board.generateStagedMoves(quiets=False)
+
+        values = Evaluation.EXCHANGEVALUES
+        for move in moves:
+            if not inCheck:
+                if not move >> PROMOTIONSHIFT & 0b111 and bestScore + values[Move.victimOf(move)] + DELTAMARGIN <= alpha:
+                    continue #Delta pruning: even winning the piece for free can't raise alpha
+                if board.staticExchange(move) < 0:
+                    continue #Loses material once the exchange on the square is played out
+
+            board.makeMove(move)
+            score = -self.__quiescence(board, -beta, -alpha, ply + 1, board.inCheck())
+            board.unmakeMove(move)
+            if self.stopped:
+                return 0
+
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        break
+
+        if bestScore == -INFINITY: #In check with no legal moves
+            return -MATE + ply
+        return bestScore
+
+    def __negamax(self, board : GameBoard.Board, depth : int, alpha : int, beta : int, ply : int) -> int:
+        if self.stopped or self.__limitReached():
+            self.stopped = True
+            return 0
+        self.pv[ply] = []
+        if ply and board.isDraw(): #Repeating a position inside the tree counts as a draw, either side could repeat it again
+            return 0
+
+        inCheck = board.inCheck()
+        if inCheck:
+            depth += 1 #Check extension
+        if depth <= 0 or ply >= MAXPLY - 1:
+            return self.__quiescence(board, alpha, beta, ply, inCheck)
+        self.nodes += 1
+
+        key = board.zobristKey
+        hashMove = 0
+        if entry := self.table.probe(key):
+            entryDepth, entryScore, bound, hashMove = entry
+            if ply > 0 and entryDepth >= depth and beta - alpha == 1: #Only cut on null window nodes to keep the PV intact
+                entryScore = _scoreFromTable(entryScore, ply)
+                if bound == Bound.EXACT or (bound == Bound.LOWER and entryScore >= beta) or (bound == Bound.UPPER and entryScore <= alpha):
+                    return entryScore
+
+        colourIndex = board.colourToMove.value >> 4
+        previousMove = self.moveStack[ply - 1] if ply else 0
+        killers = self.ordering.killersAt(ply, previousMove)
+        triedQuiets = []
+
+        originalAlpha = alpha
+        bestScore = -INFINITY
+        bestMove = 0
+        for index, move in enumerate(board.generateStagedMoves(hashMove, killers, self.ordering.historyKey(colourIndex))):
+            self.moveStack[ply] = move
+            board.makeMove(move)
+            if index == 0:
+                score = -self.__negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else: #Principal variation search: prove the move is worse with a null window, re-search if it isn't
+                score = -self.__negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.__negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmakeMove(move)
+
+            if self.stopped:
+                return 0
+
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        if Move.isQuiet(move):
+                            self.ordering.update(colourIndex, ply, move, previousMove, depth, triedQuiets)
+                        break
+            if Move.isQuiet(move):
+                triedQuiets.append(move)
+
+        if not bestMove: #No legal moves
+            return -MATE + ply if inCheck else 0
+
+        if bestScore >= beta:
+            bound = Bound.LOWER
+        elif bestScore > originalAlpha:
+            bound = Bound.EXACT
+        else:
+            bound = Bound.UPPER
+        self.table.store(key, depth, _scoreToTable(bestScore, ply), bound, bestMove)
+        return bestScore
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches a position for the best move")
+    parser.add_argument("FEN", nargs="?", help="Position to search, the start position if omitted")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--time", type=float, help="Seconds to search for")
+    parser.add_argument("--hash", type=float, default=16, metavar="MB")
+    parser.add_argument("--debug", action="store_true", help="Check the incremental evaluation against a full recompute at every leaf")
+    args = parser.parse_args()
+    if args.depth is None and args.nodes is None and args.time is None:
+        args.depth = 5
+    Evaluation.DEBUG = args.debug
+
+    board = GameBoard.Board(args.FEN)
+    result = Search(args.hash).search(board, args.depth, args.nodes, args.time, callback=print)
+    print(f"bestmove {Move.encodedToAlgebraic(result.bestMove) if result.bestMove else '(none)'}")
+
+if __name__ == "__main__":
+    main()
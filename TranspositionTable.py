@@ -0,0 +1,125 @@
+from enum import Enum
+
+class Bound(Enum):
+    NONE = 0
+    EXACT = 1
+    LOWER = 2 #Score is at least the stored score (fail high)
+    UPPER = 3 #Score is at most the stored score (fail low)
+
+_BOUNDS = (Bound.NONE, Bound.EXACT, Bound.LOWER, Bound.UPPER)
+_FULL = 0xFFFF_FFFF_FFFF_FFFF
+
+def _checkWord(score : int, move : int, meta : int) -> int:
+    """Folds the data of an entry into 64 bits, for the key check"""
+    return (score & _FULL) ^ (meta << 28) ^ ((move << 44) & _FULL)
+
+class TranspositionTable():
+    """Fixed size hash table of search results keyed by Board.zobristKey
+
+    Entries live in preallocated parallel arrays over one buffer, so memory stays at the configured size however long it is used.
+    Each bucket has two slots: slot 0 keeps the deepest (or newest generation) result, slot 1 is always replaced.
+    Entry metadata is packed into 16 bits: depth (8) | bound (2) | generation (6)
+
+    The key is stored XORed with a check word of the entry's score, move and metadata (lockless hashing). Processes sharing
+    the buffer write entries without locks, so a reader can see a new key with old data or the reverse; such a torn
+    entry no longer XORs back to its key and reads as a miss, instead of giving another position's score
+    """
+    SLOTS = 2
+    GENERATIONS = 64
+
+    ENTRYBYTES = 8 + 8 + 4 + 2 #key, score, move, meta
+
+    def __init__(self, sizeMB : float = 16, buffer = None):
+        """buffer: optional writable buffer of bufferSize(sizeMB) bytes (e.g. SharedMemory.buf) to keep the entries in,
+        so processes attached to the same buffer share one table. A private zeroed buffer is used otherwise"""
+        self.size = TranspositionTable.slotCount(sizeMB)
+        self.bucketMask = self.size // self.SLOTS - 1
+
+        if buffer is None:
+            buffer = bytearray(TranspositionTable.bufferSize(sizeMB))
+        self.buffer = buffer
+        self.__view = memoryview(buffer)[:self.size * self.ENTRYBYTES]
+        size = self.size
+        self.keys = self.__view[0 : 8 * size].cast("Q")
+        self.scores = self.__view[8 * size : 16 * size].cast("q")
+        self.moves = self.__view[16 * size : 20 * size].cast("I")
+        self.meta = self.__view[20 * size : 22 * size].cast("H")
+
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 #Stores that evicted a different position
+
+    def slotCount(sizeMB : float) -> int:
+        buckets = 1
+        while buckets * 2 * TranspositionTable.SLOTS * TranspositionTable.ENTRYBYTES <= sizeMB * 1024 * 1024:
+            buckets *= 2 #Power of two bucket count, so the index is a mask of the key
+        return buckets * TranspositionTable.SLOTS
+
+    def bufferSize(sizeMB : float) -> int:
+        return TranspositionTable.slotCount(sizeMB) * TranspositionTable.ENTRYBYTES
+
+    def newSearch(self):
+        """Ages the table, entries from older generations are replaced first"""
+        self.generation = (self.generation + 1) % self.GENERATIONS
+
+    def clear(self):
+        self.__view[:] = bytes(len(self.__view))
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key : int):
+        """Returns (depth, score, bound, move) of the stored entry for key, or None"""
+        index = (key & self.bucketMask) * self.SLOTS
+        for slot in range(index, index + self.SLOTS):
+            #Every field is read once, so the values checked against the key are the ones returned
+            score, move, meta = self.scores[slot], self.moves[slot], self.meta[slot]
+            if self.keys[slot] ^ _checkWord(score, move, meta) == key:
+                self.hits += 1
+                return (meta >> 8, score, _BOUNDS[(meta >> 6) & 0b11], move)
+        self.misses += 1
+        return None
+
+    def __storedKey(self, slot : int) -> int:
+        """Key of the entry in slot, 0 if the slot is empty"""
+        return self.keys[slot] ^ _checkWord(self.scores[slot], self.moves[slot], self.meta[slot])
+
+    def store(self, key : int, depth : int, score : int, bound : Bound, move : int = 0):
+        index = (key & self.bucketMask) * self.SLOTS
+        first = self.__storedKey(index)
+        second = self.__storedKey(index + 1)
+
+        if first == key or first == 0:
+            slot = index
+        elif second == key:
+            slot = index + 1
+        else:
+            storedMeta = self.meta[index]
+            #Depth preferred slot takes the new entry if it is at least as deep or the stored one is from an old search
+            if depth >= storedMeta >> 8 or storedMeta & 0b111111 != self.generation:
+                slot = index
+            else:
+                slot = index + 1
+            if (first, second)[slot - index]:
+                self.collisions += 1
+
+        if (first, second)[slot - index] == key and not move:
+            move = self.moves[slot] #Keep the known best move when the new result has none
+
+        meta = (min(depth, 255) << 8) | (bound.value << 6) | self.generation
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.meta[slot] = meta
+        self.keys[slot] = key ^ _checkWord(score, move, meta)
+
+    def hashfull(self) -> int:
+        """Permille of the first 1000 slots used by the current generation"""
+        sample = min(1000, self.size)
+        used = sum(1 for x in range(sample) if self.__storedKey(x) and self.meta[x] & 0b111111 == self.generation)
+        return used * 1000 // sample
+
+    def stats(self) -> dict:
+        return {"size": self.size, "hits": self.hits, "misses": self.misses, "collisions": self.collisions, "hashfull": self.hashfull()}
@@ -0,0 +1,18 @@
+"""Random keys for Zobrist hashing of GameBoard.Board positions
+
+A position's key is the XOR of the key of every piece on its square, the key of the castling rights,
+the en passant file key (if there is an en passant square) and SIDEKEY if black is to move.
+"""
+import random
+
+_rng = random.Random(0x5EED_C4E55)
+
+#PIECEKEYS[pieceValue][square], only the twelve coloured piece values are filled in
+PIECEKEYS = tuple(tuple(_rng.getrandbits(64) for square in range(64)) if (piece & 0b000111) and (piece & 0b011000) else (0,) * 64 for piece in range(23))
+
+#Indexed by the castling rights mask, see Board.castlingRights
+CASTLINGKEYS = tuple(_rng.getrandbits(64) for rights in range(16))
+
+ENPASSANTKEYS = tuple(_rng.getrandbits(64) for file in range(8))
+
+SIDEKEY = _rng.getrandbits(64)